@@ -0,0 +1,228 @@
+import sys
+import os
+import json
+import hashlib
+import platform
+from concurrent.futures import ProcessPoolExecutor
+from common import *
+from mip import build_model, GRB
+from telemetry import Telemetry, peak_rss
+from randomInstance import write_random_instance
+
+# The instances of the suite are created by randomInstance.py from these parameters. Their files are only written if
+# missing, and the digests of the files are stored with the results, such that a baseline is only compared against
+# results for the same instance.
+SUITE = {
+  'depots10': { 'numDepots': 10, 'numCrossDocks': 4, 'numShifts': 8, 'trolleysPerDepot': 2000, 'seed': 1, 'tickHours': 1.0 },
+  'depots30': { 'numDepots': 30, 'numCrossDocks': 4, 'numShifts': 4, 'trolleysPerDepot': 600, 'seed': 1, 'tickHours': 1.0 },
+  'depots100': { 'numDepots': 100, 'numCrossDocks': 8, 'numShifts': 2, 'trolleysPerDepot': 200, 'seed': 1, 'tickHours': 2.0 },
+  'depots300': { 'numDepots': 300, 'numCrossDocks': 12, 'numShifts': 2, 'trolleysPerDepot': 100, 'volumeSpread': 0.5, 'seed': 1, 'tickHours': 2.0 },
+  'depots1000': { 'numDepots': 1000, 'numCrossDocks': 20, 'numShifts': 1, 'trolleysPerDepot': 50, 'volumeSpread': 0.5, 'seed': 1, 'tickHours': 2.0 },
+}
+
+def printUsage(errorMessage=None):
+  if errorMessage is not None:
+    print(f'Error: {errorMessage}')
+  print(f'Usage: {sys.argv[0]} <instance directory> [OPTIONS...]')
+  print('Runs the benchmark suite. Instances that are missing in the directory are created first. For each instance, the')
+  print('time for parsing, for each phase of building the model, for solving to the first incumbent and for writing the')
+  print('solution is measured in a separate process, together with the model size and the peak memory.')
+  print('Options:')
+  print(f'  -i LIST    Run the comma-separated instances of LIST among {",".join(SUITE)} (default: depots10,depots30,depots100).')
+  print('  -b FILE    Compare the results against the baseline in <FILE>.')
+  print('  -w FILE    Write the results to <FILE>, e.g., as a new baseline.')
+  print('  -x FACTOR  Report phases that take more than FACTOR times as long as in the baseline as regressions (default: 1.5).')
+  print('  -e FILE    Append all telemetry events to <FILE> as JSON lines.')
+  print('  -t TIME    Stop solving for the first incumbent after TIME seconds (default: 600).')
+  print('  -v         Build variables and constraints in bulk via the matrix API.')
+  print('  -p         Only create variables that are reachable from a trolley release and can reach a deadline.')
+  print('  -s NAME    Use solver NAME, which is either gurobi (default) or highs.')
+  print('The options -t, -v, -p and -s default to those stored in the baseline. The comparison is refused if they differ')
+  print('from the baseline. Times and memory are only compared if the baseline was recorded on the same host, whereas the')
+  print('instances, the model sizes and the values of the first incumbents are compared everywhere.')
+  sys.exit(1)
+
+def file_digest(fileName):
+  f = open(fileName, 'rb')
+  digest = hashlib.sha256(f.read()).hexdigest()[:16]
+  f.close()
+  return digest
+
+def create_instance(directory, name):
+  '''Creates the files of the suite instance in directory unless they exist, and returns their names.'''
+  networkFileName = os.path.join(directory, f'{name}.network')
+  trolleysFileName = os.path.join(directory, f'{name}.csv')
+  if not os.path.exists(networkFileName) or not os.path.exists(trolleysFileName):
+    print(f'Creating instance {name}.')
+    parameters = { key: value for key,value in SUITE[name].items() if key != 'tickHours' }
+    write_random_instance(networkFileName, trolleysFileName, **parameters)
+  return networkFileName, trolleysFileName
+
+def run_benchmark(name, networkFileName, trolleysFileName, solver='gurobi', vectorized=False, prune=False, timeLimit=600, telemetryFileName=None):
+  '''
+  Measures one instance and returns the results: the seconds of each phase, the model size, the value of the first
+  incumbent and the peak RSS. Runs in a fresh process, such that the peak RSS is that of this instance.
+  '''
+  telemetry = Telemetry(None, instance=name, solver=solver)
+  with telemetry.phase('parseNetwork'):
+    network = Network(networkFileName, useCache=False)
+  with telemetry.phase('parseTrolleys'):
+    trolleys = network.readTrolleys(trolleysFileName)
+  network.setDiscretization(SUITE[name]['tickHours'], 0.0)
+
+  with telemetry.phase('build_model'):
+    mip = build_model(network, trolleys, False, None, 1e4, vectorized, prune, solver, telemetry=telemetry)
+  size = mip.modelSize()
+
+  mip.setSollimit(1)
+  mip.setTimelimit(timeLimit)
+  with telemetry.phase('firstIncumbent'):
+    status = mip.optimize()
+  objective = None
+  if mip.getSolCount() > 0:
+    objective = mip.getSolutionValue()[0]
+    base = os.path.splitext(trolleysFileName)[0]
+    with telemetry.phase('writeText'):
+      mip.writeUsedTrucks(f'{base}.sol')
+    with telemetry.phase('writeBinary'):
+      mip.writeUsedTrucks(f'{base}.npz')
+  mip.setTelemetry(None)
+  if telemetryFileName is not None:
+    f = open(telemetryFileName, 'a')
+    f.writelines(json.dumps(event) + '\n' for event in telemetry.events)
+    f.close()
+
+  seconds = { event['phase']: event['seconds'] for event in telemetry.events if event['event'] == 'phase' }
+  return dict(network=file_digest(networkFileName), trolleys=file_digest(trolleysFileName), seconds=seconds,
+    status=status, objective=objective, peakRss=peak_rss(), **size)
+
+def host():
+  '''Describes the machine, such that times are only compared between runs on the same one.'''
+  return { 'node': platform.node(), 'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count() }
+
+def compare_results(results, baseline, factor=1.5, minSeconds=0.1):
+  '''
+  Compares the results of all instances with the baseline, which must have the same options, and returns the number of
+  regressions. The instances, the model sizes and the values of first incumbents that were found before the time limit
+  must be equal everywhere. Phases are only compared on the same host, where it is a regression if a phase takes more
+  than factor times as long as in the baseline and at least minSeconds longer.
+  '''
+  sameHost = results['host'] == baseline['host']
+  if not sameHost:
+    print(f'The baseline was recorded on another host ({baseline["host"]["node"]}), so only the model sizes and values are compared.')
+  regressions = 0
+  for name,result in results['instances'].items():
+    if not name in baseline['instances']:
+      print(f'Instance {name} is not in the baseline.')
+      continue
+    base = baseline['instances'][name]
+    if (result['network'], result['trolleys']) != (base['network'], base['trolleys']):
+      print(f'Instance {name} differs from the one of the baseline, so it is not compared.')
+      regressions += 1
+      continue
+    for key in ['variables', 'constraints', 'nonzeros']:
+      if result[key] != base[key]:
+        print(f'{name:12s} {key:32s} {base[key]:9d} {result[key]:9d} REGRESSION')
+        regressions += 1
+    finished = [GRB.OPTIMAL, GRB.SOLUTION_LIMIT]
+    if result['status'] in finished and base['status'] in finished and abs(result['objective'] - base['objective']) > 1.0e-6 * max(1.0, abs(base['objective'])):
+      print(f'{name:12s} {"first incumbent":32s} {base["objective"]:9.2f} {result["objective"]:9.2f} REGRESSION')
+      regressions += 1
+    if not sameHost:
+      continue
+    for phase,seconds in result['seconds'].items():
+      baseSeconds = base['seconds'].get(phase)
+      if baseSeconds is None:
+        print(f'{name:12s} {phase:32s} {"":>9s} {seconds:9.3f}')
+        continue
+      regression = seconds > factor * baseSeconds and seconds - baseSeconds >= minSeconds
+      regressions += regression
+      print(f'{name:12s} {phase:32s} {baseSeconds:9.3f} {seconds:9.3f} {seconds / max(baseSeconds, 1.0e-6):7.2f}x' + (' REGRESSION' if regression else ''))
+    if result['peakRss'] is not None and base['peakRss'] is not None:
+      print(f'{name:12s} {"peak RSS (MB)":32s} {base["peakRss"] / 2**20:9.1f} {result["peakRss"] / 2**20:9.1f} {result["peakRss"] / base["peakRss"]:7.2f}x')
+  return regressions
+
+if __name__ == "__main__":
+
+  if len(sys.argv) < 2:
+    printUsage('Requires 1 argument.')
+
+  directory = sys.argv[1]
+  names = ['depots10', 'depots30', 'depots100']
+  baselineFileName = None
+  writeFileName = None
+  factor = 1.5
+  telemetryFileName = None
+  options = {}
+  a = 2
+  while a < len(sys.argv):
+    arg = sys.argv[a]
+    if arg == '-i' and a+1 < len(sys.argv):
+      names = sys.argv[a+1].split(',')
+      a += 1
+    elif arg == '-b' and a+1 < len(sys.argv):
+      baselineFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-w' and a+1 < len(sys.argv):
+      writeFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-x' and a+1 < len(sys.argv):
+      factor = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-e' and a+1 < len(sys.argv):
+      telemetryFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-t' and a+1 < len(sys.argv):
+      options['timeLimit'] = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-v':
+      options['vectorized'] = True
+    elif arg == '-p':
+      options['prune'] = True
+    elif arg == '-s' and a+1 < len(sys.argv):
+      options['solver'] = sys.argv[a+1]
+      a += 1
+    else:
+      printUsage(f'Unprocessed argument <{arg}>.')
+    a += 1
+
+  for name in names:
+    if not name in SUITE:
+      printUsage(f'Unknown instance <{name}>.')
+
+  # Options that are not given are taken from the baseline, and a comparison with other options is refused.
+  baseline = None
+  defaults = { 'solver': 'gurobi', 'vectorized': False, 'prune': False, 'timeLimit': 600.0 }
+  if baselineFileName is not None:
+    f = open(baselineFileName, 'r')
+    baseline = json.load(f)
+    f.close()
+    defaults = baseline['options']
+    for key,value in options.items():
+      if value != defaults[key]:
+        print(f'Error: The baseline <{baselineFileName}> was recorded with {key} = {defaults[key]}, but {value} is given.')
+        sys.exit(1)
+  options = { **defaults, **options }
+  os.makedirs(directory, exist_ok=True)
+
+  results = { 'options': options, 'host': host(), 'instances': {} }
+  for name in names:
+    networkFileName, trolleysFileName = create_instance(directory, name)
+    print(f'Running instance {name}.')
+    with ProcessPoolExecutor(max_workers=1) as executor:
+      result = executor.submit(run_benchmark, name, networkFileName, trolleysFileName, options['solver'],
+        options['vectorized'], options['prune'], options['timeLimit'], telemetryFileName).result()
+    results['instances'][name] = result
+    print(f'Instance {name} has {result["variables"]} variables, {result["constraints"]} constraints and {result["nonzeros"]} nonzeros; the first incumbent has value {result["objective"]}.')
+
+  if writeFileName is not None:
+    f = open(writeFileName, 'w')
+    json.dump(results, f, indent=2)
+    f.write('\n')
+    f.close()
+
+  if baseline is not None:
+    regressions = compare_results(results, baseline, factor)
+    print(f'Found {regressions} regressions compared to <{baselineFileName}>.')
+    if regressions > 0:
+      sys.exit(1)
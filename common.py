@@ -1,8 +1,13 @@
 import math
 import csv
+import os
+import hashlib
+import numpy as np
 
 class LocationData:
 
+  __slots__ = ('name', 'x', 'y', 'sourceCapacity', 'targetCapacity', 'crossCapacity', 'numDocks')
+
   def __init__(self, name, x, y, sourceCapacity, targetCapacity, crossCapacity, numDocks):
     self.name = name
     self.x = x
@@ -11,10 +16,11 @@ class LocationData:
     self.targetCapacity = targetCapacity
     self.crossCapacity = crossCapacity
     self.numDocks = numDocks
-    self.distances = {}
 
 class Trolley:
 
+  __slots__ = ('source', 'release', 'commodity')
+
   def __init__(self, source, release, commodity):
     self.source = source
     self.release = release
@@ -23,10 +29,38 @@ class Trolley:
   def get_commodity(self):
     return self.commodity
 
+class TrolleySet:
+  '''Trolleys stored as arrays of sources, targets, shifts and release times.
+  Indexing by an integer and iterating yield Trolley objects; indexing by a slice or mask yields a TrolleySet.'''
+
+  __slots__ = ('sources', 'targets', 'shifts', 'releases')
+
+  def __init__(self, sources, targets, shifts, releases):
+    self.sources = sources
+    self.targets = targets
+    self.shifts = shifts
+    self.releases = releases
+
+  def __len__(self):
+    return len(self.sources)
+
+  def __getitem__(self, index):
+    if isinstance(index, (int, np.integer)):
+      return Trolley(int(self.sources[index]), float(self.releases[index]), (int(self.targets[index]), int(self.shifts[index])))
+    return TrolleySet(self.sources[index], self.targets[index], self.shifts[index], self.releases[index])
+
+  def __iter__(self):
+    for source,target,shift,release in zip(self.sources.tolist(), self.targets.tolist(), self.shifts.tolist(), self.releases.tolist()):
+      yield Trolley(source, release, (target, shift))
+
 class Network:
 
-  def __init__(self, fileName=None):
+  def __init__(self, fileName=None, useCache=True):
+    '''Reads the network file, if given. With useCache, the parsed network is stored in binary files next to it and
+    read from there as long as the network file's content does not change. The distance matrix is then memory-mapped,
+    such that concurrent processes share it.'''
     self._locationData = []
+    self._distanceMatrix = np.zeros((0,0))
     self._nameToLocation = {}
     self._commodities = {}
     self._connections = []
@@ -34,42 +68,128 @@ class Network:
     self._loadingTime = None
     self._unloadingTime = None
     if fileName:
-      f = open(fileName, 'r')
-      for line in f.read().split('\n'):
-        line = line.strip().split()
-        if not line:
-          continue
-        elif line[0] == 'l':
-          self.addLocation(LocationData(line[1], float(line[2]), float(line[3]), int(line[4]), int(line[5]), int(line[6]), int(line[7])))
-        elif line[0] == 'd':
-          self.addArc(int(line[1]), int(line[2]), float(line[3]))
-        elif line[0] == 'c':
-          self.addCommodity(int(line[1]), int(line[2]), float(line[3]))
-        elif line[0] == 'U':
-          self._truckCapacity = int(line[1])
-        elif line[0] == 'i':
-          self._unloadingTime = float(line[1])
-        elif line[0] == 'o':
-          self._loadingTime = float(line[1])
-        else:
-          assert False
+      f = open(fileName, 'rb')
+      content = f.read()
+      f.close()
+      digest = hashlib.sha256(content).hexdigest()
+      if useCache and self._readCache(fileName, digest):
+        return
+      self._parse(content.decode())
+      if useCache:
+        self._writeCache(fileName, digest)
+
+  def _parse(self, content):
+    for line in content.split('\n'):
+      line = line.strip().split()
+      if not line:
+        continue
+      elif line[0] == 'l':
+        self.addLocation(LocationData(line[1], float(line[2]), float(line[3]), int(line[4]), int(line[5]), int(line[6]), int(line[7])))
+      elif line[0] == 'd':
+        self.addArc(int(line[1]), int(line[2]), float(line[3]))
+      elif line[0] == 'c':
+        self.addCommodity(int(line[1]), int(line[2]), float(line[3]))
+      elif line[0] == 'U':
+        self._truckCapacity = int(line[1])
+      elif line[0] == 'i':
+        self._unloadingTime = float(line[1])
+      elif line[0] == 'o':
+        self._loadingTime = float(line[1])
+      else:
+        assert False
+
+  def _cacheFileNames(self, fileName, digest):
+    return f'{fileName}.cache.npz', f'{fileName}.{digest[:16]}.npy'
+
+  def _readCache(self, fileName, digest):
+    cacheFileName, distancesFileName = self._cacheFileNames(fileName, digest)
+    try:
+      cache = np.load(cacheFileName)
+      if str(cache['hash']) != digest:
+        return False
+      distances = np.load(distancesFileName, mmap_mode='c')
+    except (OSError, KeyError, ValueError):
+      return False
+    for name,x,y,sourceCapacity,targetCapacity,crossCapacity,numDocks in zip(cache['names'].tolist(), cache['x'].tolist(), cache['y'].tolist(),
+      cache['sourceCapacity'].tolist(), cache['targetCapacity'].tolist(), cache['crossCapacity'].tolist(), cache['numDocks'].tolist()):
+      self.addLocation(LocationData(name, x, y, sourceCapacity, targetCapacity, crossCapacity, numDocks))
+    self._distanceMatrix = distances
+    for target,shift,deadline in zip(cache['commodityTargets'].tolist(), cache['commodityShifts'].tolist(), cache['commodityDeadlines'].tolist()):
+      self.addCommodity(target, shift, deadline)
+    truckCapacity, unloadingTime, loadingTime = cache['times'].tolist()
+    self._truckCapacity = None if math.isnan(truckCapacity) else int(truckCapacity)
+    self._unloadingTime = None if math.isnan(unloadingTime) else unloadingTime
+    self._loadingTime = None if math.isnan(loadingTime) else loadingTime
+    return True
+
+  def _writeCache(self, fileName, digest):
+    cacheFileName, distancesFileName = self._cacheFileNames(fileName, digest)
+    oldDistancesFileName = None
+    try:
+      oldDistancesFileName = self._cacheFileNames(fileName, str(np.load(cacheFileName)['hash']))[1]
+    except (OSError, KeyError, ValueError):
+      pass
+
+    # We write to temporary files first such that concurrent processes never see incomplete files.
+    try:
+      f = open(f'{distancesFileName}.{os.getpid()}', 'wb')
+      np.save(f, np.ascontiguousarray(self.distanceMatrix))
+      f.close()
+      os.replace(f'{distancesFileName}.{os.getpid()}', distancesFileName)
+      f = open(f'{cacheFileName}.{os.getpid()}', 'wb')
+      np.savez(f, hash=digest, names=np.array([ self.name(p) for p in self.locations ], dtype=str),
+        x=np.array([ self.x(p) for p in self.locations ], dtype=float), y=np.array([ self.y(p) for p in self.locations ], dtype=float),
+        sourceCapacity=np.array([ self.sourceCapacity(p) for p in self.locations ], dtype=int),
+        targetCapacity=np.array([ self.targetCapacity(p) for p in self.locations ], dtype=int),
+        crossCapacity=np.array([ self.crossCapacity(p) for p in self.locations ], dtype=int),
+        numDocks=np.array([ self.numDocks(p) for p in self.locations ], dtype=int),
+        commodityTargets=np.array([ target for target,shift in self.commodities ], dtype=int),
+        commodityShifts=np.array([ shift for target,shift in self.commodities ], dtype=int),
+        commodityDeadlines=np.array([ self.deadline(k) for k in self.commodities ], dtype=float),
+        times=np.array([ np.nan if value is None else value for value in (self._truckCapacity, self._unloadingTime, self._loadingTime) ], dtype=float))
+      f.close()
+      os.replace(f'{cacheFileName}.{os.getpid()}', cacheFileName)
+      if oldDistancesFileName and oldDistancesFileName != distancesFileName and os.path.exists(oldDistancesFileName):
+        os.remove(oldDistancesFileName)
+    except OSError as e:
+      print(f'Could not write network cache for <{fileName}>: {e}')
 
   def addLocation(self, locationData):
     v = len(self._locationData)
     self._nameToLocation[locationData.name] = v
     self._locationData.append(locationData)
+    if v >= len(self._distanceMatrix):
+      distanceMatrix = np.full((max(16, 2*v), max(16, 2*v)), np.nan)
+      distanceMatrix[:v,:v] = self._distanceMatrix[:v,:v]
+      self._distanceMatrix = distanceMatrix
     self._connections += [ (s,v) for s in range(v) ] + [ (v,s) for s in range(v) ]
     return v
 
   def addArc(self, source, target, distance):
-    self._locationData[source].distances[target] = distance
+    self._distanceMatrix[source,target] = distance
 
   def addCommodity(self, target, shift, deadline):
     self._commodities[(target,shift)] = deadline
 
   def setDiscretization(self, tickHours, tickZero=0.0):
+    '''Sets the discretization and precomputes the tick tables; must be called after the network is complete.'''
     self._tickHours = tickHours
     self._tickZero = tickZero
+    distances = self.distanceMatrix
+    missing = np.argwhere(np.isnan(distances))
+    if len(missing) > 0:
+      source, target = missing[0].tolist()
+      raise KeyError(f'Missing distance from {self.name(source)} to {self.name(target)} and {len(missing) - 1} other arcs.')
+    self._distanceTickMatrix = np.ceil(distances / tickHours).astype(int)
+    self._travelTickMatrix = np.ceil((distances + self._loadingTime + self._unloadingTime) / tickHours).astype(int)
+    self._deadlineTickArray = np.floor((np.array(list(self._commodities.values()), dtype=float) - tickZero) / tickHours).astype(int)
+    self._distanceTicks = self._distanceTickMatrix.tolist()
+    self._travelTicks = self._travelTickMatrix.tolist()
+    self._deadlineTicks = dict(zip(self._commodities.keys(), self._deadlineTickArray.tolist()))
+    numShifts = max([ shift for target,shift in self._commodities ], default=-1) + 1
+    self._deadlineTickTable = np.full((len(self._locationData), numShifts), np.iinfo(int).min)
+    for (target,shift),tick in self._deadlineTicks.items():
+      self._deadlineTickTable[target,shift] = tick
 
   def setTruckCapacity(self, truckCapacity):
     self._truckCapacity = truckCapacity
@@ -133,7 +253,7 @@ class Network:
     return self._commodities[commodity]
 
   def deadlineTick(self, commodity):
-    return int(math.floor((self.deadline(commodity) - self._tickZero) / self._tickHours))
+    return self._deadlineTicks[commodity]
 
   def tickTime(self, tick):
     '''Converts ticks to time units.'''
@@ -144,10 +264,44 @@ class Network:
     return int(round((time - self._tickZero) / self._tickHours ,0))
 
   def distance(self, source, target):
-    return self._locationData[source].distances[target]
+    distance = self._distanceMatrix[source,target]
+    if distance != distance:
+      raise KeyError(f'Missing distance from {self.name(source)} to {self.name(target)}.')
+    return distance
+
+  @property
+  def distanceMatrix(self):
+    '''Returns the N x N array of distances.'''
+    N = len(self._locationData)
+    return self._distanceMatrix[:N,:N]
+
+  def distanceTicks(self, source, target):
+    return self._distanceTicks[source][target]
 
   def travelTicks(self, source, target):
-    return int(math.ceil((self.distance(source, target) + self._loadingTime + self._unloadingTime) / self._tickHours))
+    return self._travelTicks[source][target]
+
+  @property
+  def distanceTickMatrix(self):
+    '''Returns the N x N array of ticks needed to drive from source to target.'''
+    return self._distanceTickMatrix
+
+  @property
+  def travelTickMatrix(self):
+    '''Returns the N x N array of ticks needed to load, drive and unload from source to target.'''
+    return self._travelTickMatrix
+
+  def deadlineTicks(self, targets, shifts):
+    '''Returns the deadline ticks of the commodities given by arrays of targets and shifts.'''
+    ticks = self._deadlineTickTable[targets, shifts]
+    if np.any(ticks == np.iinfo(int).min):
+      raise KeyError('Trolleys with unknown commodities.')
+    return ticks
+
+  @property
+  def deadlineTickArray(self):
+    '''Returns the deadline ticks of all commodities, in the order of commodities.'''
+    return self._deadlineTickArray
 
   def isCross(self, location):
     return self._locationData[location].crossCapacity > 0
@@ -172,17 +326,62 @@ class Network:
     f.write('\n')
 
   def readTrolleys(self, fileName):
-    trolleys = []
+    chunks = list(self.readTrolleyChunks(fileName))
+    if not chunks:
+      return TrolleySet(np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0, dtype=float))
+    return TrolleySet(*( np.concatenate(arrays) for arrays in zip(*chunks) ))
+
+  def readTrolleyChunks(self, fileName, chunkSize=100000):
+    '''Streams the trolleys file, yielding arrays (source, target, shift, release) of at most chunkSize trolleys.'''
     f = open(fileName, 'r')
     reader = csv.reader(f)
     header = next(reader, None)
+    chunk = []
     for row in reader:
+      if not row:
+        continue
       if len(row) == 1:
         row = row[0].split(';')
-      trolleys.append(Trolley(self.find(row[0]), float(row[-1]), (self.find(row[1]), int(row[-2]))))
-
-    return trolleys
+      chunk.append((self.find(row[0]), self.find(row[1]), int(row[-2]), float(row[-1])))
+      if len(chunk) == chunkSize:
+        yield self._trolleyChunkArrays(chunk)
+        chunk = []
+    f.close()
+    if chunk:
+      yield self._trolleyChunkArrays(chunk)
+
+  def _trolleyChunkArrays(self, chunk):
+    sources, targets, shifts, releases = zip(*chunk)
+    return np.array(sources, dtype=int), np.array(targets, dtype=int), np.array(shifts, dtype=int), np.array(releases, dtype=float)
+
+  def readTrolleyCounts(self, fileName, chunkSize=100000):
+    '''Returns the numbers of trolleys per (source, release tick, target, shift) in the trolleys file.'''
+    counts = {}
+    for chunk in self.readTrolleyChunks(fileName, chunkSize):
+      self._countTrolleyArrays(TrolleySet(*chunk), counts)
+    return counts
+
+  def _countTrolleyArrays(self, trolleys, counts):
+    keys, numbers = np.unique(np.stack((trolleys.sources, self.trolleyReleaseTicks(trolleys.releases), trolleys.targets, trolleys.shifts), axis=1), axis=0, return_counts=True)
+    for key,number in zip(map(tuple, keys.tolist()), numbers.tolist()):
+      counts[key] = counts.get(key, 0) + number
+
+  def countTrolleys(self, trolleys):
+    '''Returns the numbers of trolleys per (source, release tick, target, shift).'''
+    counts = {}
+    if isinstance(trolleys, TrolleySet):
+      if len(trolleys) > 0:
+        self._countTrolleyArrays(trolleys, counts)
+      return counts
+    for t in trolleys:
+      key = (t.source, self.trolleyReleaseTick(t), t.commodity[0], t.commodity[1])
+      counts[key] = counts.get(key, 0) + 1
+    return counts
 
   def trolleyReleaseTick(self, trolley):
     return int(math.ceil((trolley.release - self._tickZero) / self._tickHours))
 
+  def trolleyReleaseTicks(self, releases):
+    '''Converts an array of release times to release ticks.'''
+    return np.ceil((releases - self._tickZero) / self._tickHours).astype(int)
+
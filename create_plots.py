@@ -1,5 +1,6 @@
 from mip import *
 from common import *
+from solutionfile import read_solution_file
 import matplotlib.pyplot as plt
 import math
 
@@ -38,16 +39,11 @@ def createPlots(network, trolleys, logfile):
         if deadline > maxtick:
             maxtick = deadline        
 
-    f = open(logfile, 'r')
-
     # read the capacities used by the trucks in the previous solution
     truck_outflow = {}
     truck_inflow = {}
-    for line in f:
-        if not line.startswith('S '):
-            continue
-        split = line.split()
-        i, j, target, shift, ticktime, num = int(split[1]), int(split[2]), int(split[3]), int(split[4]), float(split[5]), float(split[6])
+    for i, j, target, shift, ticktime, num in read_solution_file(logfile).shipments.tolist():
+        num = math.ceil(round(num, 2))
         
         tick = time2tick(ticktime, tickZero, tickHours)
         deadline = int(math.floor((network.deadline((target,shift)) - tickZero) / tickHours))
@@ -61,8 +57,6 @@ def createPlots(network, trolleys, logfile):
         arrival = tick + network.travelTicks(i,j)
         truck_inflow[j,target,deadline,arrival] = truck_inflow.get((j,target,deadline,arrival), 0) + num
 
-    f.close()
-
     print("inflow")
     for k in inflow.keys():
         if k[0] == 0 and k[2] == 1 and k[3] == 65:
@@ -0,0 +1,245 @@
+import sys
+import math
+import time
+from common import *
+from mip import MIP, write_solution
+
+def printUsage(errorMessage=None):
+  if errorMessage is not None:
+    print(f'Error: {errorMessage}')
+  print(f'Usage: {sys.argv[0]} <network file name> <tickhours> <tickzero> <trolleys file name> [OPTIONS...]')
+  print('Constructs a plan that routes every trolley directly or via one cross-dock, consolidating trolleys on trucks.')
+  print('Options:')
+  print('  -o FILE  Write used trucks to <FILE>.')
+  print('  -m       Modify trolleys to become deliverable instead of removing them.')
+  sys.exit(1)
+
+class _Shipment:
+  '''Trolleys of one commodity that are available at the origin of a leg at tick release and must leave by latest.'''
+
+  __slots__ = ('release', 'latest', 'count', 'target', 'shift', 'nextLeg')
+
+  def __init__(self, release, latest, count, target, shift, nextLeg):
+    self.release = release
+    self.latest = latest
+    self.count = count
+    self.target = target
+    self.shift = shift
+    self.nextLeg = nextLeg # (cross-dock, target) if the shipment is continued from the destination of this leg
+
+def construct_greedy(mip):
+  '''
+  Constructs a solution for the trolleys of the mip (see MIP.prepareTrolleys) within its ticks. For each source and
+  commodity, trolleys go directly if they fill at least one truck over the day and otherwise via the cross-dock with
+  the shortest detour through which they arrive in time. Trucks carry the most urgent available trolleys and leave when
+  they are full and neither docks nor the storage at the target are exceeded, when trolleys would otherwise be late, or
+  when the storage at their origin would overflow. In the latter two cases, a truck leaves at the latest earlier tick
+  with free docks, or urgent trolleys go directly instead of via a cross-dock. If neither is possible, the truck still
+  leaves and uses extra docks, which are penalized. Returns the values (objective, distance, penalty, not produced, not
+  delivered) and the solution (trucks, flows) keyed by time as MIP.getSolution does.
+  '''
+  network = mip.network
+  minTick, maxTick = mip.mintick, mip.maxtick
+  capacity = network.truckCapacity
+  loadingTicks = network.loadingTicks
+  unloadingTicks = network.unloadingTicks
+  crossDocks = [ j for j in network.locations if network.isCross(j) ]
+
+  # Total volume per source and commodity decides between direct and cross-dock routes.
+  volume = {}
+  for (source,releaseTick,target,shift),count in mip.trolleycounts.items():
+    volume[source,target,shift] = volume.get((source,target,shift), 0) + count
+
+  legs = {}
+  notDelivered = 0
+  for (source,releaseTick,target,shift),count in mip.trolleycounts.items():
+    deadline = min(network.deadlineTick((target,shift)), maxTick)
+    direct = _Shipment(releaseTick, deadline - network.travelTicks(source,target), count, target, shift, None)
+    best = None
+    if volume[source,target,shift] < capacity or direct.latest < releaseTick:
+      for j in crossDocks:
+        if j == source or j == target:
+          continue
+        secondLatest = deadline - network.travelTicks(j,target)
+        firstLatest = secondLatest - network.travelTicks(source,j)
+        if firstLatest >= releaseTick and (best is None or network.distance(source,j) + network.distance(j,target) < best[0]):
+          best = (network.distance(source,j) + network.distance(j,target), j, firstLatest)
+    if best is not None:
+      legs.setdefault((source,best[1]), []).append(_Shipment(releaseTick, best[2], count, target, shift, (best[1],target)))
+    elif direct.latest >= releaseTick:
+      legs.setdefault((source,target), []).append(direct)
+    else:
+      notDelivered += count
+
+  docks = {}
+  def docksUsed(i, j, t):
+    '''Returns the (node, tick) pairs of the docks that a truck from i to j at tick t occupies.'''
+    arrival = t + network.travelTicks(i,j)
+    return [ (i,s) for s in range(t, t + loadingTicks) ] + [ (j,s) for s in range(arrival - unloadingTicks, arrival) if s >= minTick ]
+
+  def fits(i, j, t, numTrucks):
+    return all( docks.get(key, 0) + numTrucks <= network.numDocksPerTick(key[0]) for key in docksUsed(i, j, t) )
+
+  trucks = {}
+  flows = {}
+  targetStorage = {}
+  def select(pending, t, numTrucks):
+    '''Returns the most urgent available shipments with the amounts that fit on numTrucks trucks.'''
+    space = numTrucks * capacity
+    selection = []
+    for shipment in pending:
+      if space <= 1.0e-6:
+        break
+      if shipment.release <= t:
+        amount = min(shipment.count, space)
+        space -= amount
+        selection.append((shipment, amount))
+    return selection
+
+  def targetTicks(j, arrival, shipment):
+    '''Returns the ticks in which a shipment arriving at its target j at tick arrival waits for its deadline.'''
+    if shipment.nextLeg is not None or shipment.target != j:
+      return range(0)
+    return range(arrival, min(network.deadlineTick((shipment.target,shipment.shift)), maxTick + 1))
+
+  def targetFits(i, j, t, selection):
+    arrival = t + network.travelTicks(i,j)
+    added = {}
+    for shipment,amount in selection:
+      for s in targetTicks(j, arrival, shipment):
+        added[s] = added.get(s, 0.0) + amount
+    return all( targetStorage.get((j,s), 0.0) + amount <= network.targetCapacity(j) + 1.0e-6 for s,amount in added.items() )
+
+  def dispatch(i, j, t, pending, numTrucks, selection=None):
+    '''Sends numTrucks trucks from i to j at tick t, loaded with the most urgent available trolleys.'''
+    arrival = t + network.travelTicks(i,j)
+    for shipment,amount in selection if selection is not None else select(pending, t, numTrucks):
+      shipment.count -= amount
+      key = (i,j,network.tickTime(t),shipment.target,shipment.shift)
+      flows[key] = flows.get(key, 0.0) + amount
+      for s in targetTicks(j, arrival, shipment):
+        targetStorage[j,s] = targetStorage.get((j,s), 0.0) + amount
+      if shipment.nextLeg is not None:
+        deadline = min(network.deadlineTick((shipment.target,shipment.shift)), maxTick)
+        legs.setdefault(shipment.nextLeg, []).append(_Shipment(arrival, deadline - network.travelTicks(*shipment.nextLeg), amount, shipment.target, shipment.shift, None))
+    pending[:] = [ shipment for shipment in pending if shipment.count > 1.0e-6 ]
+    trucks[i,j,network.tickTime(t)] = trucks.get((i,j,network.tickTime(t)), 0) + numTrucks
+    for key in docksUsed(i, j, t):
+      docks[key] = docks.get(key, 0) + numTrucks
+
+  def availableLoad(pending, t):
+    return sum( shipment.count for shipment in pending if shipment.release <= t )
+
+  def urgentLoad(pending, t):
+    return sum( shipment.count for shipment in pending if shipment.release <= t and shipment.latest <= t )
+
+  def dispatchFitting(i, j, t, pending, urgent):
+    '''
+    Sends one truck with trolleys that must leave by tick t, which are the urgent ones or otherwise all available ones,
+    at the latest tick up to t in which they are available and docks and the storage at j allow it. A truck leaving at t
+    is filled with the most urgent available trolleys, an earlier one only carries trolleys that must leave, as others
+    would only wait longer at j. Docks and target storage are reserved for all ticks, but the storage of a cross-dock
+    is only checked while simulating, so trucks to a cross-dock must still arrive after t. Returns the number of
+    trolleys sent, which is 0 if there is no such tick.
+    '''
+    leaving = [ shipment for shipment in pending if shipment.latest <= t ] if urgent else pending
+    for s in range(t, minTick - 1, -1):
+      selection = select(pending if s == t else leaving, s, 1)
+      if not any( shipment in leaving for shipment,amount in selection ):
+        break
+      if s + network.travelTicks(i,j) <= t and any( shipment.nextLeg is not None for shipment,amount in selection ):
+        continue
+      if fits(i, j, s, 1) and targetFits(i, j, s, selection):
+        dispatch(i, j, s, pending, 1, selection)
+        return sum( amount for shipment,amount in selection )
+    return 0
+
+  def reroute(i, t, pending):
+    '''Moves urgent trolleys that go via a cross-dock to the direct leg if they still arrive in time from there.'''
+    moved = False
+    for shipment in pending:
+      if shipment.nextLeg is None or shipment.release > t or shipment.latest > t or shipment.target == i:
+        continue
+      latest = min(network.deadlineTick((shipment.target,shipment.shift)), maxTick) - network.travelTicks(i,shipment.target)
+      if latest > t:
+        legs.setdefault((i,shipment.target), []).append(_Shipment(shipment.release, latest, shipment.count, shipment.target, shipment.shift, None))
+        shipment.count = 0.0
+        moved = True
+    pending[:] = [ shipment for shipment in pending if shipment.count > 1.0e-6 ]
+    return moved
+
+  # Simulate the ticks: a truck leaves as soon as it is full and docks are free, or when trolleys must leave to arrive
+  # in time, or when the storage at its origin would overflow. Trolleys reaching a cross-dock join the legs from there.
+  # Trucks that must leave by tick t leave earlier if docks are only free then, and urgent trolleys via a cross-dock go
+  # directly if that is still in time. Only if neither is possible, trucks leave at tick t using extra docks.
+  storage = { i: network.sourceCapacity(i) + network.crossCapacity(i) for i in network.locations }
+  for t in range(minTick, maxTick + 1):
+    for (i,j),pending in list(legs.items()):
+      pending.sort(key=lambda shipment: shipment.latest)
+      while availableLoad(pending, t) >= capacity - 1.0e-6 and fits(i, j, t, 1):
+        selection = select(pending, t, 1)
+        if not targetFits(i, j, t, selection):
+          break
+        dispatch(i, j, t, pending, 1, selection)
+      while urgentLoad(pending, t) > 1.0e-6:
+        if not dispatchFitting(i, j, t, pending, True) and not reroute(i, t, pending):
+          dispatch(i, j, t, pending, 1)
+
+    waiting = {}
+    for (i,j),pending in legs.items():
+      waiting[i] = waiting.get(i, 0.0) + availableLoad(pending, t)
+    for i,load in waiting.items():
+      while load > storage[i] + 1.0e-6:
+        # Prefer trucks whose trolleys fit into the storage at their destination.
+        arcs = sorted(( (arc,pending) for arc,pending in legs.items() if arc[0] == i and availableLoad(pending, t) > 1.0e-6 ),
+          key=lambda item: (targetFits(*item[0], t, select(item[1], t, 1)), availableLoad(item[1], t)), reverse=True)
+        for (arcI,arcJ),pending in arcs:
+          amount = dispatchFitting(arcI, arcJ, t, pending, False)
+          if amount > 0:
+            break
+        else:
+          (arcI,arcJ),pending = arcs[0]
+          amount = min(capacity, availableLoad(pending, t))
+          dispatch(arcI, arcJ, t, pending, 1)
+        load -= amount
+
+  totalDistance = sum( count * network.distance(i,j) for (i,j,departure),count in trucks.items() )
+  extraDocks = {}
+  for (i,t),used in docks.items():
+    extraDocks[i] = max(extraDocks.get(i, 0), used - network.numDocksPerTick(i))
+  totalPenalty = mip.undeliveredPenalty * notDelivered + mip.extraDockPenalty * sum(extraDocks.values())
+  return (totalDistance + totalPenalty, totalDistance, totalPenalty, 0.0, notDelivered), (trucks, flows)
+
+if __name__ == "__main__":
+
+  if len(sys.argv) < 5:
+    printUsage('Requires 4 arguments.')
+
+  network = Network(sys.argv[1])
+  tickHours = float(sys.argv[2])
+  tickZero = float(sys.argv[3])
+  trolleys = network.readTrolleys(sys.argv[4])
+
+  writeTrucksFileName = None
+  modifyTrolleysDeliverable = False
+  a = 5
+  while a < len(sys.argv):
+    arg = sys.argv[a]
+    if arg == '-o' and a+1 < len(sys.argv):
+      writeTrucksFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-m':
+      modifyTrolleysDeliverable = True
+    else:
+      printUsage(f'Unprocessed argument <{arg}>.')
+    a += 1
+
+  network.setDiscretization(tickHours, tickZero)
+  mip = MIP(network, None, 1e4)
+  mip.setTimeHorizon(mip.prepareTrolleys(trolleys, modifyTrolleysDeliverable))
+
+  start = time.time()
+  vals, solution = construct_greedy(mip)
+  print(f'Constructed a solution with value {vals[0]} with total distance {vals[1]:.2f} and penalties {vals[2]:.1f} ({vals[4]:.1f} not delivered) in {time.time() - start:.3f} seconds.')
+  if writeTrucksFileName is not None:
+    write_solution(writeTrucksFileName, vals, solution, network.truckCapacity)
@@ -0,0 +1,442 @@
+import numpy as np
+import highspy
+
+# Minimal modeling layer on top of HiGHS that mimics the subset of gurobipy used by mip.py (Model, Var, quicksum, MVar,
+# GRB constants). The model is collected in Python lists and passed to HiGHS in one call when it is optimized or written.
+
+class GRB:
+  CONTINUOUS = 'C'
+  INTEGER = 'I'
+  BINARY = 'B'
+  INFINITY = 1e100
+  UNDEFINED = 1e101
+  LESS_EQUAL = '<'
+  GREATER_EQUAL = '>'
+  EQUAL = '='
+
+  LOADED = 1
+  OPTIMAL = 2
+  INFEASIBLE = 3
+  INF_OR_UNBD = 4
+  UNBOUNDED = 5
+  ITERATION_LIMIT = 7
+  TIME_LIMIT = 9
+  SOLUTION_LIMIT = 10
+  INTERRUPTED = 11
+  MEM_LIMIT = 17
+
+_statusMap = {
+  highspy.HighsModelStatus.kOptimal: GRB.OPTIMAL,
+  highspy.HighsModelStatus.kModelEmpty: GRB.OPTIMAL,
+  highspy.HighsModelStatus.kInfeasible: GRB.INFEASIBLE,
+  highspy.HighsModelStatus.kUnboundedOrInfeasible: GRB.INF_OR_UNBD,
+  highspy.HighsModelStatus.kUnbounded: GRB.UNBOUNDED,
+  highspy.HighsModelStatus.kIterationLimit: GRB.ITERATION_LIMIT,
+  highspy.HighsModelStatus.kTimeLimit: GRB.TIME_LIMIT,
+  highspy.HighsModelStatus.kSolutionLimit: GRB.SOLUTION_LIMIT,
+  highspy.HighsModelStatus.kInterrupt: GRB.INTERRUPTED,
+  highspy.HighsModelStatus.kMemoryLimit: GRB.MEM_LIMIT,
+}
+
+def _toHighsInf(values):
+  values = np.asarray(values, dtype=float)
+  values[values >= GRB.INFINITY] = np.inf
+  values[values <= -GRB.INFINITY] = -np.inf
+  return values
+
+class LinExpr:
+
+  __slots__ = ('_indices', '_coefs', '_constant')
+
+  def __init__(self, indices=None, coefs=None, constant=0.0):
+    self._indices = indices if indices is not None else []
+    self._coefs = coefs if coefs is not None else []
+    self._constant = constant
+
+  def _add(self, other, factor):
+    if isinstance(other, Var):
+      self._indices.append(other.index)
+      self._coefs.append(factor)
+    elif isinstance(other, LinExpr):
+      self._indices.extend(other._indices)
+      self._coefs.extend(c * factor for c in other._coefs)
+      self._constant += factor * other._constant
+    else:
+      self._constant += factor * other
+    return self
+
+  def copy(self):
+    return LinExpr(list(self._indices), list(self._coefs), self._constant)
+
+  def __add__(self, other):
+    return self.copy()._add(other, 1.0)
+
+  def __radd__(self, other):
+    return self.copy()._add(other, 1.0)
+
+  def __iadd__(self, other):
+    return self._add(other, 1.0)
+
+  def __sub__(self, other):
+    return self.copy()._add(other, -1.0)
+
+  def __rsub__(self, other):
+    return LinExpr()._add(other, 1.0)._add(self, -1.0)
+
+  def __isub__(self, other):
+    return self._add(other, -1.0)
+
+  def __mul__(self, factor):
+    return LinExpr()._add(self, factor)
+
+  __rmul__ = __mul__
+
+  def __neg__(self):
+    return LinExpr()._add(self, -1.0)
+
+  def __le__(self, other):
+    return TempConstr(self - other, GRB.LESS_EQUAL)
+
+  def __ge__(self, other):
+    return TempConstr(self - other, GRB.GREATER_EQUAL)
+
+  def __eq__(self, other):
+    return TempConstr(self - other, GRB.EQUAL)
+
+  __hash__ = object.__hash__
+
+class Var:
+
+  __slots__ = ('_model', 'index')
+
+  def __init__(self, model, index):
+    self._model = model
+    self.index = index
+
+  def _expr(self):
+    return LinExpr([self.index], [1.0])
+
+  def __add__(self, other):
+    return self._expr()._add(other, 1.0)
+
+  __radd__ = __add__
+
+  def __sub__(self, other):
+    return self._expr()._add(other, -1.0)
+
+  def __rsub__(self, other):
+    return LinExpr()._add(other, 1.0)._add(self, -1.0)
+
+  def __mul__(self, factor):
+    return LinExpr([self.index], [float(factor)])
+
+  __rmul__ = __mul__
+
+  def __neg__(self):
+    return LinExpr([self.index], [-1.0])
+
+  def __le__(self, other):
+    return TempConstr(self - other, GRB.LESS_EQUAL)
+
+  def __ge__(self, other):
+    return TempConstr(self - other, GRB.GREATER_EQUAL)
+
+  def __eq__(self, other):
+    return TempConstr(self - other, GRB.EQUAL)
+
+  __hash__ = object.__hash__
+
+  @property
+  def VarName(self):
+    return self._model._colNames[self.index]
+
+  @property
+  def obj(self):
+    return self._model._colCost[self.index]
+
+  @obj.setter
+  def obj(self, value):
+    self._model._colCost[self.index] = value
+
+  Obj = obj
+
+  @property
+  def lb(self):
+    return self._model._colLower[self.index]
+
+  @lb.setter
+  def lb(self, value):
+    self._model._colLower[self.index] = value
+
+  LB = lb
+
+  @property
+  def ub(self):
+    return self._model._colUpper[self.index]
+
+  @ub.setter
+  def ub(self, value):
+    self._model._colUpper[self.index] = value
+
+  UB = ub
+
+  @property
+  def start(self):
+    return self._model._start.get(self.index, GRB.INFINITY)
+
+  @start.setter
+  def start(self, value):
+    self._model._start[self.index] = value
+
+  Start = start
+
+  @property
+  def x(self):
+    if self._model._solution is None:
+      raise AttributeError('Unable to retrieve attribute \'X\'')
+    return self._model._solution[self.index]
+
+  X = x
+
+class TempConstr:
+
+  __slots__ = ('expr', 'sense')
+
+  def __init__(self, expr, sense):
+    self.expr = expr
+    self.sense = sense
+
+class MVar:
+
+  def __init__(self, variables):
+    self._vars = variables
+
+  @staticmethod
+  def fromlist(variables):
+    return MVar(list(variables))
+
+  def tolist(self):
+    return self._vars
+
+  def __len__(self):
+    return len(self._vars)
+
+def quicksum(terms):
+  expr = LinExpr()
+  for term in terms:
+    expr._add(term, 1.0)
+  return expr
+
+class _Params:
+
+  # gurobipy parameter names (lower case) and their HiGHS counterparts. Others, e.g., MIPFocus, are ignored.
+  _highsNames = {
+    'timelimit': 'time_limit',
+    'solutionlimit': 'mip_max_improving_sols',
+    'mipgap': 'mip_rel_gap',
+    'outputflag': 'output_flag',
+    'seed': 'random_seed',
+    'threads': 'threads',
+  }
+
+  def __init__(self, model):
+    object.__setattr__(self, '_model', model)
+
+  def __setattr__(self, name, value):
+    highsName = self._highsNames.get(name.lower())
+    if highsName is not None:
+      self._model._options[highsName] = value
+
+  def __getattr__(self, name):
+    return self._model._options.get(self._highsNames.get(name.lower()))
+
+class Model:
+
+  def __init__(self, name=''):
+    self._name = name
+    self._colCost = []
+    self._colLower = []
+    self._colUpper = []
+    self._colIntegrality = []
+    self._colNames = []
+    self._vars = []
+    self._rowStart = [0]
+    self._rowIndex = []
+    self._rowValue = []
+    self._rowLower = []
+    self._rowUpper = []
+    self._rowNames = []
+    self._options = {}
+    self._start = {}
+    self._solution = None
+    self._objVal = None
+    self._objBound = None
+    self._runtime = 0.0
+    self._status = GRB.LOADED
+    self.params = _Params(self)
+    self.Params = self.params
+
+  def addVar(self, lb=0.0, ub=GRB.INFINITY, obj=0.0, vtype=GRB.CONTINUOUS, name=''):
+    var = Var(self, len(self._vars))
+    self._vars.append(var)
+    self._colCost.append(obj)
+    self._colLower.append(lb)
+    self._colUpper.append(1.0 if vtype == GRB.BINARY and ub >= GRB.INFINITY else ub)
+    self._colIntegrality.append(vtype != GRB.CONTINUOUS)
+    self._colNames.append(name if name else f'C{var.index}')
+    return var
+
+  def addMVar(self, shape, lb=0.0, ub=GRB.INFINITY, obj=0.0, vtype=GRB.CONTINUOUS, name=''):
+    count = int(np.prod(shape))
+    first = len(self._vars)
+    lb, ub, obj = (np.broadcast_to(np.asarray(a, dtype=float), (count,)) for a in (lb, ub, obj))
+    if vtype == GRB.BINARY:
+      ub = np.where(ub >= GRB.INFINITY, 1.0, ub)
+    names = name if not isinstance(name, str) else [ f'{name}[{k}]' if name else '' for k in range(count) ]
+    variables = [ Var(self, index) for index in range(first, first + count) ]
+    self._vars.extend(variables)
+    self._colCost.extend(obj.tolist())
+    self._colLower.extend(lb.tolist())
+    self._colUpper.extend(ub.tolist())
+    self._colIntegrality.extend([ vtype != GRB.CONTINUOUS ] * count)
+    self._colNames.extend( n if n else f'C{first + k}' for k,n in enumerate(names) )
+    return MVar(variables)
+
+  def _addRow(self, indices, values, sense, rhs, name):
+    self._rowIndex.extend(indices)
+    self._rowValue.extend(values)
+    self._rowStart.append(len(self._rowIndex))
+    self._rowLower.append(rhs if sense in [GRB.GREATER_EQUAL, GRB.EQUAL] else -np.inf)
+    self._rowUpper.append(rhs if sense in [GRB.LESS_EQUAL, GRB.EQUAL] else np.inf)
+    self._rowNames.append(name if name else f'R{len(self._rowNames)}')
+
+  def addConstr(self, constr, name=''):
+    coefs = {}
+    for index,coef in zip(constr.expr._indices, constr.expr._coefs):
+      coefs[index] = coefs.get(index, 0.0) + coef
+    self._addRow(coefs.keys(), coefs.values(), constr.sense, -constr.expr._constant, name)
+
+  def addMConstr(self, A, x, sense, b, name=''):
+    A = A.tocsr()
+    A.sum_duplicates()
+    columns = np.fromiter((var.index for var in x.tolist()), dtype=np.int64, count=len(x))
+    rows = A.shape[0]
+    first = len(self._rowNames)
+    b = np.broadcast_to(np.asarray(b, dtype=float), (rows,)).tolist()
+    names = name if not isinstance(name, str) else [ '' ] * rows
+    self._rowStart.extend((len(self._rowIndex) + A.indptr[1:]).tolist())
+    self._rowIndex.extend(columns[A.indices].tolist())
+    self._rowValue.extend(A.data.tolist())
+    self._rowLower.extend(b if sense in [GRB.GREATER_EQUAL, GRB.EQUAL] else [ -np.inf ] * rows)
+    self._rowUpper.extend(b if sense in [GRB.LESS_EQUAL, GRB.EQUAL] else [ np.inf ] * rows)
+    self._rowNames.extend( n if n else f'R{first + r}' for r,n in enumerate(names) )
+
+  def update(self):
+    pass
+
+  def getVars(self):
+    return list(self._vars)
+
+  def getAttr(self, name, variables):
+    '''Returns the attribute (X, Obj, LB, UB or Start) of the given variables in one array.'''
+    name = name.lower()
+    if name == 'x':
+      if self._solution is None:
+        raise AttributeError('Unable to retrieve attribute \'X\'')
+      values = self._solution
+    elif name == 'obj':
+      values = self._colCost
+    elif name == 'lb':
+      values = self._colLower
+    elif name == 'ub':
+      values = self._colUpper
+    elif name == 'start':
+      return np.array([ self._start.get(var.index, GRB.INFINITY) for var in variables ], dtype=float)
+    else:
+      raise AttributeError(f'Unknown attribute \'{name}\'')
+    indices = np.fromiter((var.index for var in variables), dtype=np.int64, count=len(variables))
+    return np.asarray(values, dtype=float)[indices]
+
+  @property
+  def NumVars(self):
+    return len(self._vars)
+
+  @property
+  def NumConstrs(self):
+    return len(self._rowLower)
+
+  @property
+  def NumNZs(self):
+    return len(self._rowIndex)
+
+  def _createHighs(self):
+    lp = highspy.HighsLp()
+    lp.model_name_ = self._name
+    lp.num_col_ = len(self._vars)
+    lp.num_row_ = len(self._rowLower)
+    lp.col_cost_ = np.array(self._colCost, dtype=float)
+    lp.col_lower_ = _toHighsInf(self._colLower)
+    lp.col_upper_ = _toHighsInf(self._colUpper)
+    lp.row_lower_ = _toHighsInf(self._rowLower)
+    lp.row_upper_ = _toHighsInf(self._rowUpper)
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.start_ = np.array(self._rowStart, dtype=np.int32)
+    lp.a_matrix_.index_ = np.array(self._rowIndex, dtype=np.int32)
+    lp.a_matrix_.value_ = np.array(self._rowValue, dtype=float)
+    lp.integrality_ = [ highspy.HighsVarType.kInteger if integral else highspy.HighsVarType.kContinuous for integral in self._colIntegrality ]
+    lp.col_names_ = self._colNames
+    lp.row_names_ = self._rowNames
+    highs = highspy.Highs()
+    highs.passModel(lp)
+    for name,value in self._options.items():
+      highs.setOptionValue(name, value)
+    return highs
+
+  def optimize(self):
+    highs = self._createHighs()
+
+    # Only the start values are passed, such that resetting them to GRB.UNDEFINED drops the start. The solution of an
+    # earlier solve belongs to that solve and is not used.
+    start = { index: value for index,value in self._start.items() if value < GRB.INFINITY }
+    if start:
+      highs.setSolution(len(start), np.array(list(start.keys()), dtype=np.int32), np.array(list(start.values()), dtype=float))
+    self._solution = None
+    self._objVal = None
+    highs.run()
+
+    self._status = _statusMap.get(highs.getModelStatus(), GRB.LOADED)
+    info = highs.getInfo()
+    self._runtime = highs.getRunTime()
+    if info.primal_solution_status == highspy.SolutionStatus.kSolutionStatusFeasible:
+      self._solution = list(highs.getSolution().col_value)
+      self._objVal = info.objective_function_value
+    self._objBound = info.mip_dual_bound if any(self._colIntegrality) else info.objective_function_value
+
+  @property
+  def status(self):
+    return self._status
+
+  Status = status
+
+  @property
+  def objVal(self):
+    if self._solution is None:
+      raise AttributeError('Unable to retrieve attribute \'objVal\'')
+    return self._objVal
+
+  ObjVal = objVal
+
+  @property
+  def ObjBound(self):
+    return self._objBound
+
+  @property
+  def SolCount(self):
+    return 0 if self._solution is None else 1
+
+  @property
+  def Runtime(self):
+    return self._runtime
+
+  def write(self, fileName):
+    self._createHighs().writeModel(fileName)
@@ -0,0 +1,197 @@
+import sys
+import math
+import time
+from common import *
+from mip import build_model, write_solution, GRB
+
+def printUsage(errorMessage=None):
+  if errorMessage is not None:
+    print(f'Error: {errorMessage}')
+  print(f'Usage: {sys.argv[0]} <network file name> <tickhours> <tickzero> <trolleys file name> [OPTIONS...]')
+  print('Computes a lower bound and solutions by Lagrangian relaxation of the truck capacity constraints.')
+  print('Options:')
+  print('  -o FILE  Write used trucks of the best solution to <FILE>.')
+  print('  -t TIME  Stop after TIME seconds in total (default: 3600).')
+  print('  -u TIME  Solve each Lagrangian subproblem for at most TIME seconds (default: 60).')
+  print('  -n NUM   Stop after NUM iterations (default: 100).')
+  print('  -m       Modify trolleys to become deliverable instead of removing them.')
+  print('  -v       Build variables and constraints in bulk via the matrix API.')
+  print('  -p       Only create variables that are reachable from a trolley release and can reach a deadline.')
+  print('  -s NAME  Use solver NAME, which is either gurobi (default) or highs.')
+  sys.exit(1)
+
+def run_lagrange(network, trolleys, tickHours, tickZero, modifyTrolleysDeliverable, writeTrucksFileName, timeLimit, iterationTimeLimit, maxIterations, vectorized=False, prune=False, solver='gurobi', threads=4):
+  '''
+  The truck capacity constraints are the only ones that link the truck variables to the flow variables. Dualizing them
+  with multipliers decomposes the model into a truck part (with docking constraints) and a flow part (with flow balance
+  and storage constraints), which the solver handles as independent components. The multipliers are updated by
+  subgradient steps. In each iteration, the flows of the subproblem together with enough trucks to carry them form a
+  solution of the full model. Returns the best lower bound and the values of the best solution (or None).
+  '''
+
+  start = time.time()
+  print(f'Read instance with {len(network.locations)} locations and {len(trolleys)} trolleys.')
+  network.setDiscretization(tickHours, tickZero)
+
+  print('Creating the full model for evaluating solutions.')
+  full = build_model(network, trolleys, modifyTrolleysDeliverable, None, 1e4, vectorized, prune, solver, threads)
+  print('Creating the Lagrangian subproblem without truck capacity constraints.')
+  relaxed = build_model(network, trolleys, modifyTrolleysDeliverable, None, 1e4, vectorized, prune, solver, threads, relaxCapacity=True)
+
+  capacity = network.truckCapacity
+  distance = { key: var.obj for key,var in relaxed.truckvars.items() if not isinstance(var, float) }
+  arcFlows = {}
+  for (i,j,t,target,shift),var in relaxed.flowvars.items():
+    arcFlows.setdefault((i,j,t), []).append(((i,j,t,target,shift), var))
+
+  # Flows on arcs without a truck variable are zero in the full model, which the subproblem keeps as bounds.
+  for key in list(arcFlows):
+    if not key in distance:
+      for _,var in arcFlows.pop(key):
+        var.ub = 0.0
+
+  # No optimal solution uses more trucks on an arc than needed for all trolleys. Without this bound, trucks with
+  # negative Lagrangian costs make the subproblem bound useless.
+  maxTrucks = math.ceil(len(trolleys) / capacity)
+  for var in relaxed.truckvars.values():
+    if not isinstance(var, float) and var.ub > maxTrucks:
+      var.ub = maxTrucks
+
+  def evaluate(trucks, flows):
+    for key,var in full.truckvars.items():
+      if not isinstance(var, float):
+        var.start = trucks.get(key, 0)
+    for key,var in full.flowvars.items():
+      var.start = flows.get(key, GRB.UNDEFINED)
+    full.setSollimit(1)
+    full.setTimelimit(max(1, min(iterationTimeLimit, timeLimit - (time.time() - start))))
+    full.optimize()
+    return full.getSolutionValue() if full.getSolCount() > 0 else None
+
+  # Initially, every trolley pays its share of a full truck, which makes trucks free in the subproblem.
+  multipliers = { (i,j,t): distance[i,j,t] / capacity for (i,j,t) in arcFlows }
+  bestBound = -math.inf
+  bestValue = math.inf
+  bestVals = None
+  bestSolution = None
+  stepFactor = 0.5
+  numNonImproving = 0
+  iteration = 0
+  while iteration < maxIterations and time.time() - start < timeLimit:
+    iteration += 1
+
+    for key,var in relaxed.truckvars.items():
+      if not isinstance(var, float):
+        var.obj = distance[key] - capacity * multipliers.get(key, 0.0)
+    for key,flows in arcFlows.items():
+      for _,var in flows:
+        var.obj = multipliers[key]
+    relaxed.setTimelimit(max(1, min(iterationTimeLimit, timeLimit - (time.time() - start))))
+    relaxed.optimize()
+    if relaxed.getSolCount() == 0:
+      print(f'Iteration {iteration}: no solution of the subproblem found.')
+      break
+
+    # The bound of the subproblem is a lower bound for the full model even if the subproblem is not solved to optimality.
+    bound = relaxed.getObjBound()
+    if bound > bestBound + 1.0e-6:
+      bestBound = bound
+      numNonImproving = 0
+    else:
+      numNonImproving += 1
+      if numNonImproving >= 5:
+        stepFactor /= 2
+        numNonImproving = 0
+
+    flows = {}
+    trucks = {}
+    subgradient = {}
+    for key,arcFlow in arcFlows.items():
+      usage = 0.0
+      for flowKey,var in arcFlow:
+        x = var.x
+        if x > 1.0e-4:
+          flows[flowKey] = x
+          usage += x
+      subgradient[key] = usage - capacity * relaxed.truckvars[key].x
+      if usage > 1.0e-4:
+        trucks[key] = math.ceil(round(usage,2) / capacity)
+
+    vals = evaluate(trucks, flows)
+    if vals is not None and vals[0] < bestValue:
+      bestValue = vals[0]
+      bestVals = vals
+      bestSolution = full.getSolution()
+
+    gap = (bestValue - bestBound) / abs(bestValue) if bestValue < math.inf and bestValue != 0 else math.inf
+    print(f'Iteration {iteration}: bound {bound:.2f}, best bound {bestBound:.2f}, best solution {bestValue:.2f}, gap {100*gap:.2f}% after {time.time() - start:.0f} seconds.')
+    if gap < 1.0e-4:
+      break
+
+    # Polyak step towards the best known solution value (or an estimate of it).
+    norm = sum( g*g for g in subgradient.values() )
+    if norm < 1.0e-9:
+      break
+    estimate = bestValue if bestValue < math.inf else bound + 0.1 * abs(bound) + 1.0
+    step = stepFactor * (estimate - bound) / norm
+    for key,g in subgradient.items():
+      multipliers[key] = max(0.0, multipliers[key] + step * g)
+
+  # The solution of the full model is kept when it is found, such that the written one is the one with the best value.
+  if bestSolution is not None and writeTrucksFileName is not None:
+    write_solution(writeTrucksFileName, bestVals, bestSolution, network.truckCapacity)
+  return bestBound, bestVals
+
+if __name__ == "__main__":
+
+  if len(sys.argv) < 5:
+    printUsage('Requires 4 arguments.')
+
+  network = Network(sys.argv[1])
+  tickHours = float(sys.argv[2])
+  tickZero = float(sys.argv[3])
+  trolleys = network.readTrolleys(sys.argv[4])
+
+  writeTrucksFileName = None
+  timeLimit = 3600
+  iterationTimeLimit = 60
+  maxIterations = 100
+  modifyTrolleysDeliverable = False
+  vectorized = False
+  prune = False
+  solver = 'gurobi'
+  a = 5
+  while a < len(sys.argv):
+    arg = sys.argv[a]
+    if arg == '-o' and a+1 < len(sys.argv):
+      writeTrucksFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-t' and a+1 < len(sys.argv):
+      timeLimit = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-u' and a+1 < len(sys.argv):
+      iterationTimeLimit = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-n' and a+1 < len(sys.argv):
+      maxIterations = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-m':
+      modifyTrolleysDeliverable = True
+    elif arg == '-v':
+      vectorized = True
+    elif arg == '-p':
+      prune = True
+    elif arg == '-s' and a+1 < len(sys.argv):
+      solver = sys.argv[a+1]
+      a += 1
+    else:
+      printUsage(f'Unprocessed argument <{arg}>.')
+    a += 1
+
+  bound, vals = run_lagrange(network, trolleys, tickHours, tickZero, modifyTrolleysDeliverable, writeTrucksFileName,
+    timeLimit, iterationTimeLimit, maxIterations, vectorized, prune, solver)
+
+  if vals is None:
+    print(f'No solution found; the lower bound is {bound:.2f}.')
+  else:
+    print(f'The best solution has value {vals[0]} with total distance {vals[1]:.2f} and penalties {vals[2]:.1f} ({vals[3]:.1f} not produced and {vals[4]:.1f} not delivered); the lower bound is {bound:.2f}.')
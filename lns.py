@@ -0,0 +1,170 @@
+import sys
+import time
+import random
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from common import *
+from mip import build_model, write_solution, read_solution
+
+def printUsage(errorMessage=None):
+  if errorMessage is not None:
+    print(f'Error: {errorMessage}')
+  print(f'Usage: {sys.argv[0]} <network file name> <tickhours> <tickzero> <trolleys file name> [OPTIONS...]')
+  print('Improves a solution by repeatedly freeing the trucks of a depot, a time window or a target, fixing all other')
+  print('trucks and solving the resulting sub-MIP.')
+  print('Options:')
+  print('  -o FILE  Write used trucks to <FILE>.')
+  print('  -i FILE  Start from the solution in <FILE> instead of the greedy solution.')
+  print('  -t TIME  Stop after TIME seconds in total (default: 3600).')
+  print('  -u TIME  Solve each sub-MIP for at most TIME seconds (default: 30).')
+  print('  -k LIST  Use the comma-separated neighbourhoods of LIST among depot, window and commodity (default: all).')
+  print('  -j NUM   Solve NUM sub-MIPs in parallel processes (default: 1).')
+  print('  -r SEED  Use SEED for choosing neighbourhoods (default: 0).')
+  print('  -m       Modify trolleys to become deliverable instead of removing them.')
+  print('  -v       Build variables and constraints in bulk via the matrix API.')
+  print('  -p       Only create variables that are reachable from a trolley release and can reach a deadline.')
+  print('  -s NAME  Use solver NAME, which is either gurobi (default) or highs.')
+  sys.exit(1)
+
+_workerMip = None
+
+def _initWorker(network, trolleys, modifyTrolleysDeliverable, vectorized, prune, solver, threads):
+  '''Builds the model once per worker process; sub-MIPs then only change bounds and start values.'''
+  global _workerMip
+  _workerMip = build_model(network, trolleys, modifyTrolleysDeliverable, None, 1e4, vectorized, prune, solver, threads)
+
+def _solveNeighbourhood(kind, seed, solution, timeLimit):
+  free = _workerMip.neighbourhood(kind, random.Random(seed), solution[1])
+  result = _workerMip.solveNeighbourhood(*solution, free, timeLimit)
+  return (kind, len(free)) + (result if result is not None else (None, None))
+
+def run_lns(network, trolleys, tickHours, tickZero, modifyTrolleysDeliverable, writeTrucksFileName, readTrucksFileName, timeLimit, subTimeLimit, kinds=['depot', 'window', 'commodity'], numJobs=1, seed=0, vectorized=False, prune=False, solver='gurobi', threads=4):
+  '''
+  Large neighbourhood search around an incumbent, which is the solution read from readTrucksFileName or otherwise the
+  greedy solution. Each step frees the trucks of a neighbourhood (see MIP.neighbourhood), fixes all others to the
+  incumbent and solves this sub-MIP for at most subTimeLimit seconds. With numJobs > 1, that many sub-MIPs run in
+  parallel processes, each with its own copy of the model. A sub-MIP always starts from the current incumbent, and a
+  better solution replaces the incumbent as soon as it is returned. Returns the values and the solution of the incumbent.
+  '''
+  start = time.time()
+  print(f'Read instance with {len(network.locations)} locations and {len(trolleys)} trolleys.')
+  network.setDiscretization(tickHours, tickZero)
+  _initWorker(network, trolleys, modifyTrolleysDeliverable, vectorized, prune, solver, threads)
+  mip = _workerMip
+
+  if readTrucksFileName is None:
+    from heuristic import construct_greedy
+    vals, solution = construct_greedy(mip)
+    print(f'Constructed a greedy solution with value {vals[0]:.2f}.')
+  else:
+    vals, solution = read_solution(readTrucksFileName)
+
+  # The start may stem from another discretization, so we let the solver complete it to a solution of this model.
+  mip.constructInitialSolutionFrom(*solution, complete=True)
+  mip.setSollimit(1)
+  mip.setTimelimit(max(1, timeLimit))
+  mip.optimize()
+  if mip.getSolCount() == 0:
+    print('The start solution could not be completed.')
+    return None, None
+  vals, solution = mip.getSolutionValue(), mip.getSolution()
+  print(f'Starting from a solution with value {vals[0]:.2f} after {time.time() - start:.0f} seconds.')
+
+  rng = random.Random(seed)
+  step = 0
+  def report(kind, numFree, stepVals):
+    nonlocal vals
+    improved = stepVals is not None and stepVals[0] < vals[0] - 1.0e-6
+    print(f'Step {step}: freed {numFree} trucks of a {kind} neighbourhood, ' + (f'improving to {stepVals[0]:.2f}' if improved else f'no improvement of {vals[0]:.2f}') + f' after {time.time() - start:.0f} seconds.')
+    return improved
+
+  if numJobs <= 1:
+    while time.time() - start < timeLimit:
+      step += 1
+      kind, numFree, stepVals, stepSolution = _solveNeighbourhood(rng.choice(kinds), rng.randrange(2**31), solution, min(subTimeLimit, max(1, timeLimit - (time.time() - start))))
+      if report(kind, numFree, stepVals):
+        vals, solution = stepVals, stepSolution
+  else:
+    # Workers are spawned instead of forked, as a solver that already ran in this process may hang in a forked copy.
+    with ProcessPoolExecutor(max_workers=numJobs, mp_context=multiprocessing.get_context('spawn'), initializer=_initWorker,
+      initargs=(network, trolleys, modifyTrolleysDeliverable, vectorized, prune, solver, max(1, threads // numJobs))) as executor:
+      pending = set()
+      while pending or time.time() - start < timeLimit:
+        while len(pending) < numJobs and time.time() - start < timeLimit:
+          pending.add(executor.submit(_solveNeighbourhood, rng.choice(kinds), rng.randrange(2**31), solution, min(subTimeLimit, max(1, timeLimit - (time.time() - start)))))
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+          step += 1
+          kind, numFree, stepVals, stepSolution = future.result()
+          if report(kind, numFree, stepVals):
+            vals, solution = stepVals, stepSolution
+
+  if writeTrucksFileName is not None:
+    write_solution(writeTrucksFileName, vals, solution, network.truckCapacity)
+  return vals, solution
+
+if __name__ == "__main__":
+
+  if len(sys.argv) < 5:
+    printUsage('Requires 4 arguments.')
+
+  network = Network(sys.argv[1])
+  tickHours = float(sys.argv[2])
+  tickZero = float(sys.argv[3])
+  trolleys = network.readTrolleys(sys.argv[4])
+
+  writeTrucksFileName = None
+  readTrucksFileName = None
+  timeLimit = 3600
+  subTimeLimit = 30
+  kinds = ['depot', 'window', 'commodity']
+  numJobs = 1
+  seed = 0
+  modifyTrolleysDeliverable = False
+  vectorized = False
+  prune = False
+  solver = 'gurobi'
+  a = 5
+  while a < len(sys.argv):
+    arg = sys.argv[a]
+    if arg == '-o' and a+1 < len(sys.argv):
+      writeTrucksFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-i' and a+1 < len(sys.argv):
+      readTrucksFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-t' and a+1 < len(sys.argv):
+      timeLimit = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-u' and a+1 < len(sys.argv):
+      subTimeLimit = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-k' and a+1 < len(sys.argv):
+      kinds = sys.argv[a+1].split(',')
+      a += 1
+    elif arg == '-j' and a+1 < len(sys.argv):
+      numJobs = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-r' and a+1 < len(sys.argv):
+      seed = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-m':
+      modifyTrolleysDeliverable = True
+    elif arg == '-v':
+      vectorized = True
+    elif arg == '-p':
+      prune = True
+    elif arg == '-s' and a+1 < len(sys.argv):
+      solver = sys.argv[a+1]
+      a += 1
+    else:
+      printUsage(f'Unprocessed argument <{arg}>.')
+    a += 1
+
+  vals, solution = run_lns(network, trolleys, tickHours, tickZero, modifyTrolleysDeliverable, writeTrucksFileName,
+    readTrucksFileName, timeLimit, subTimeLimit, kinds, numJobs, seed, vectorized, prune, solver)
+
+  if vals is None:
+    print(f'No solution found.')
+  else:
+    print(f'The best solution has value {vals[0]} with total distance {vals[1]:.2f} and penalties {vals[2]:.1f} ({vals[3]:.1f} not produced and {vals[4]:.1f} not delivered).')
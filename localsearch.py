@@ -0,0 +1,377 @@
+import sys
+import math
+import time
+import random
+import numpy as np
+from common import *
+from mip import MIP, write_solution, read_solution
+
+def printUsage(errorMessage=None):
+  if errorMessage is not None:
+    print(f'Error: {errorMessage}')
+  print(f'Usage: {sys.argv[0]} <network file name> <tickhours> <tickzero> <trolleys file name> [OPTIONS...]')
+  print('Improves a solution by local search, starting from the greedy solution unless one is read.')
+  print('Options:')
+  print('  -i FILE  Read the solution to improve from <FILE>.')
+  print('  -o FILE  Write used trucks to <FILE>.')
+  print('  -t TIME  Stop after TIME seconds (default: 10).')
+  print('  -n NUM   Stop after NUM moves were evaluated.')
+  print('  -r SEED  Use SEED for choosing moves (default: 0).')
+  print('  -m       Modify trolleys to become deliverable instead of removing them.')
+  sys.exit(1)
+
+class LocalSearch:
+  '''
+  Improves a solution (trucks, flows) of a MIP by moves that change the flows of single commodities: shifting a
+  departure by a tick, merging a partial truck into another truck on the same arc, and rerouting trolleys through a
+  cross-dock or directly to their target. The state keeps the load and number of trucks per arc and tick, the used docks
+  per node and tick, and the inventory per node, commodity and tick. A move is given as a list of flow changes
+  (i, j, tick, commodity, amount) and is evaluated by looking only at the trucks, docks and inventories it changes.
+  Moves never exceed docks or storage capacities and never create penalties; infeasibilities of the initial solution
+  are allowed to remain but not to grow.
+  '''
+
+  def __init__(self, mip, solution, seed=0):
+    network = mip.network
+    self._network = network
+    self._minTick = mip.mintick
+    self._numTicks = mip.maxtick - mip.mintick + 1
+    self._capacity = network.truckCapacity
+    self._commodities = list(network.commodities)
+    self._commodityIndex = { commodity: k for k,commodity in enumerate(self._commodities) }
+    self._crossDocks = [ i for i in network.locations if network.isCross(i) ]
+    self._random = random.Random(seed)
+    N = len(network.locations)
+    T = self._numTicks
+    K = len(self._commodities)
+    self._travel = network.travelTicks
+    self._distance = network.distanceMatrix.tolist()
+    self._targets = [ target for target,shift in self._commodities ]
+    self._deadlines = [ network.deadlineTick(commodity) - self._minTick for commodity in self._commodities ]
+
+    # Flows per arc and tick and the departures per node and commodity, with ticks relative to the first tick.
+    self._flows = {}
+    self._departures = {}
+    self._load = {}
+    trucks, flows = solution
+    for (i,j,departure,target,shift),x in flows.items():
+      if x > 1.0e-6:
+        t = network.timeTick(departure) - self._minTick
+        self._addFlow(i, j, t, self._commodityIndex[target,shift], x)
+        self._load[i,j,t] = self._load.get((i,j,t), 0.0) + x
+    self._trucks = { key: self._trucksFor(load) for key,load in self._load.items() }
+    self._distanceValue = sum( count * self._distance[i][j] for (i,j,t),count in self._trucks.items() )
+
+    # Docks used per node and tick; nodes may keep the extra docks the initial solution uses.
+    self._docks = np.zeros((N, T), dtype=int)
+    for (i,j,t),count in self._trucks.items():
+      for node,s in self._docksUsed(i, j, t):
+        self._docks[node,s] += count
+    self._dockLimit = np.maximum(self._docks.max(axis=1), [ network.numDocksPerTick(i) for i in network.locations ])
+
+    # Inventory after each tick: releases and arrivals minus departures, and at targets minus what is consumed at the
+    # deadline, which is everything that arrived until then.
+    events = np.zeros((N, K, T))
+    for (source,releaseTick,target,shift),count in mip.trolleycounts.items():
+      events[source,self._commodityIndex[target,shift],releaseTick - self._minTick] += count
+    for (i,j,t),arcFlows in self._flows.items():
+      for k,x in arcFlows.items():
+        events[i,k,t] -= x
+        events[j,k,t + self._travel(i,j)] += x
+    self._inventory = np.cumsum(events, axis=2)
+    for k,(target,deadline) in enumerate(zip(self._targets, self._deadlines)):
+      if deadline < T:
+        self._inventory[target,k,deadline:] -= self._inventory[target,k,deadline]
+
+    # Storage used per node and tick for trolleys of other targets (0) and for trolleys of the node itself (1).
+    isTarget = np.zeros((N, K), dtype=bool)
+    isTarget[self._targets, np.arange(K)] = True
+    self._storage = [ np.einsum('ikt,ik->it', self._inventory, ~isTarget * 1.0), np.einsum('ikt,ik->it', self._inventory, isTarget * 1.0) ]
+    self._storageCapacity = [ np.array([ network.sourceCapacity(i) + network.crossCapacity(i) for i in network.locations ]),
+      np.array([ network.targetCapacity(i) for i in network.locations ]) ]
+
+  def _trucksFor(self, load):
+    return math.ceil(round(load, 6) / self._capacity)
+
+  def _addFlow(self, i, j, t, k, x):
+    arcFlows = self._flows.setdefault((i,j,t), {})
+    x += arcFlows.get(k, 0.0)
+    if x > 1.0e-6:
+      arcFlows[k] = x
+      self._departures.setdefault((i,k), set()).add((j,t))
+    else:
+      arcFlows.pop(k, None)
+      self._departures.get((i,k), set()).discard((j,t))
+      if not arcFlows:
+        del self._flows[i,j,t]
+
+  def _docksUsed(self, i, j, t):
+    '''Returns the (node, tick) pairs of the docks that a truck from i to j at tick t occupies.'''
+    arrival = t + self._travel(i,j)
+    unloadingTicks = self._network.unloadingTicks
+    return [ (i,s) for s in range(t, min(t + self._network.loadingTicks, self._numTicks)) ] + [ (j,s) for s in range(max(arrival - unloadingTicks, 0), arrival) ]
+
+  @staticmethod
+  def _ranges(events, end):
+    '''Turns changes per tick into ranges [first, last) with a constant nonzero change.'''
+    ranges = []
+    change = 0.0
+    ticks = sorted(events)
+    for first,last in zip(ticks, ticks[1:] + [end]):
+      change += events[first]
+      if abs(change) > 1.0e-6 and first < last:
+        ranges.append((first, last, change))
+    return ranges
+
+  @property
+  def distance(self):
+    return self._distanceValue
+
+  def evaluate(self, changes):
+    '''Returns the change of the total distance if the flow changes were applied, or None if they are infeasible.'''
+    T = self._numTicks
+    flowChanges = {}
+    loadChanges = {}
+    events = {}
+    for i,j,t,k,x in changes:
+      arrival = t + self._travel(i,j)
+      if t < 0 or arrival >= T:
+        return None
+      flowChanges[i,j,t,k] = flowChanges.get((i,j,t,k), 0.0) + x
+      loadChanges[i,j,t] = loadChanges.get((i,j,t), 0.0) + x
+      departing = events.setdefault((i,k), {})
+      departing[t] = departing.get(t, 0.0) - x
+      arriving = events.setdefault((j,k), {})
+      arriving[arrival] = arriving.get(arrival, 0.0) + x
+
+    for (i,j,t,k),x in flowChanges.items():
+      if x < 0 and self._flows.get((i,j,t), {}).get(k, 0.0) + x < -1.0e-6:
+        return None
+
+    delta = 0.0
+    dockChanges = {}
+    for (i,j,t),x in loadChanges.items():
+      if abs(x) < 1.0e-6:
+        continue
+      load = self._load.get((i,j,t), 0.0) + x
+      if load < -1.0e-6:
+        return None
+      count = self._trucksFor(max(load, 0.0)) - self._trucks.get((i,j,t), 0)
+      if count != 0:
+        delta += count * self._distance[i][j]
+        for key in self._docksUsed(i, j, t):
+          dockChanges[key] = dockChanges.get(key, 0) + count
+    for (node,s),count in dockChanges.items():
+      if count > 0 and self._docks[node,s] + count > self._dockLimit[node]:
+        return None
+
+    storageEvents = {}
+    for (node,k),nodeEvents in events.items():
+      kind = 1 if self._targets[k] == node else 0
+      storage = storageEvents.setdefault((node,kind), {})
+      for first,last,change in self._ranges(nodeEvents, T):
+        if change < 0 and self._inventory[node,k,first:last].min() + change < -1.0e-6:
+          return None
+        storage[first] = storage.get(first, 0.0) + change
+        storage[last] = storage.get(last, 0.0) - change
+    for (node,kind),nodeEvents in storageEvents.items():
+      for first,last,change in self._ranges(nodeEvents, T):
+        if change > 0 and self._storage[kind][node,first:last].max() + change > self._storageCapacity[kind][node] + 1.0e-6:
+          return None
+    return delta
+
+  def apply(self, changes):
+    '''Applies flow changes that evaluate returned a value for.'''
+    for i,j,t,k,x in changes:
+      self._addFlow(i, j, t, k, x)
+      load = self._load.get((i,j,t), 0.0) + x
+      count = self._trucksFor(max(load, 0.0))
+      change = count - self._trucks.get((i,j,t), 0)
+      if load > 1.0e-6:
+        self._load[i,j,t] = load
+        self._trucks[i,j,t] = count
+      else:
+        self._load.pop((i,j,t), None)
+        self._trucks.pop((i,j,t), None)
+      if change != 0:
+        self._distanceValue += change * self._distance[i][j]
+        for node,s in self._docksUsed(i, j, t):
+          self._docks[node,s] += change
+      arrival = t + self._travel(i,j)
+      self._inventory[i,k,t:] -= x
+      self._inventory[j,k,arrival:] += x
+      self._storage[1 if self._targets[k] == i else 0][i,t:] -= x
+      self._storage[1 if self._targets[k] == j else 0][j,arrival:] += x
+
+  def _spare(self, i, j, t):
+    return self._trucks.get((i,j,t), 0) * self._capacity - self._load.get((i,j,t), 0.0)
+
+  def shiftMove(self, i, j, t):
+    '''Moves the trolleys of one commodity on the truck to the previous or next tick, into spare capacity if there is some.'''
+    k,x = self._random.choice(list(self._flows[i,j,t].items()))
+    other = t + self._random.choice([-1, 1])
+    spare = self._spare(i, j, other)
+    if spare > 1.0e-6:
+      x = min(x, spare)
+    return [ (i,j,t,k,-x), (i,j,other,k,x) ]
+
+  def mergeMove(self, i, j, t, maxShift=4):
+    '''Moves trolleys of a partially loaded truck to another truck on the same arc such that one truck less is needed.'''
+    excess = self._load[i,j,t] - (self._trucks[i,j,t] - 1) * self._capacity
+    other = t + self._random.choice([ s for s in range(-maxShift, maxShift + 1) if s != 0 ])
+    if self._spare(i, j, other) < excess - 1.0e-6:
+      return None
+    changes = []
+    for k,x in self._flows[i,j,t].items():
+      if excess <= 1.0e-6:
+        break
+      x = min(x, excess)
+      excess -= x
+      changes += [ (i,j,t,k,-x), (i,j,other,k,x) ]
+    return changes
+
+  def crossMove(self, i, j, t):
+    '''Reroutes the trolleys of one commodity on a direct truck through a cross-dock, preferring trucks with spare capacity.'''
+    candidates = [ (k,x) for k,x in self._flows[i,j,t].items() if self._targets[k] == j ]
+    if not candidates or not self._crossDocks:
+      return None
+    k,x = self._random.choice(candidates)
+    cross = self._random.choice(self._crossDocks)
+    if cross == i or cross == j:
+      return None
+    first = t + self._travel(i,cross)
+    last = min(self._deadlines[k], self._numTicks - 1) - self._travel(cross,j)
+    if first > last:
+      return None
+    departures = [ s for s in range(first, last + 1) if self._spare(cross, j, s) >= x - 1.0e-6 ]
+    second = self._random.choice(departures) if departures else last
+    return [ (i,j,t,k,-x), (i,cross,t,k,x), (cross,j,second,k,x) ]
+
+  def directMove(self, i, j, t):
+    '''Sends trolleys of one commodity that go through the cross-dock j directly to their target instead.'''
+    candidates = [ (k,x) for k,x in self._flows[i,j,t].items() if self._targets[k] != j ]
+    if not candidates:
+      return None
+    k,x = self._random.choice(candidates)
+    target = self._targets[k]
+    arrival = t + self._travel(i,j)
+    secondLegs = [ (other,s) for other,s in self._departures.get((j,k), ()) if other == target and s >= arrival ]
+    if not secondLegs:
+      return None
+    other,second = self._random.choice(secondLegs)
+    x = min(x, self._flows[j,target,second][k])
+    return [ (i,j,t,k,-x), (j,target,second,k,-x), (i,target,t,k,x) ]
+
+  def run(self, timeLimit, maxIterations=None):
+    '''Applies random improving or equally good moves until the time or iteration limit. Returns the number of moves
+    evaluated and applied.'''
+    start = time.time()
+    numEvaluated = 0
+    numApplied = 0
+    keys = []
+    while (maxIterations is None or numEvaluated < maxIterations) and time.time() - start < timeLimit:
+      # The list of trucks to pick from is refreshed from time to time; trucks that disappeared are skipped.
+      if numEvaluated % 1000 == 0 or not keys:
+        keys = list(self._flows)
+        if not keys:
+          break
+      i,j,t = self._random.choice(keys)
+      if not (i,j,t) in self._flows:
+        continue
+      move = self._random.random()
+      if move < 0.3:
+        changes = self.shiftMove(i, j, t)
+      elif move < 0.6:
+        changes = self.mergeMove(i, j, t)
+      elif self._network.isCross(j):
+        changes = self.directMove(i, j, t)
+      else:
+        changes = self.crossMove(i, j, t)
+      numEvaluated += 1
+      if changes is None:
+        continue
+      delta = self.evaluate(changes)
+      if delta is not None and delta <= 1.0e-6:
+        self.apply(changes)
+        numApplied += 1
+    return numEvaluated, numApplied
+
+  def getSolution(self):
+    '''Returns the solution (trucks, flows) keyed by time as MIP.getSolution does.'''
+    tickTime = lambda t: self._network.tickTime(t + self._minTick)
+    trucks = { (i,j,tickTime(t)): count for (i,j,t),count in self._trucks.items() }
+    flows = {}
+    for (i,j,t),arcFlows in self._flows.items():
+      for k,x in arcFlows.items():
+        target,shift = self._commodities[k]
+        flows[i,j,tickTime(t),target,shift] = x
+    return trucks, flows
+
+def improve_solution(mip, vals, solution, timeLimit, maxIterations=None, seed=0):
+  '''
+  Improves a solution (trucks, flows) of the mip with the values (objective, distance, penalty, not produced,
+  not delivered) by local search. Returns the values and the solution after the search; the penalties do not change.
+  '''
+  start = time.time()
+  search = LocalSearch(mip, solution, seed)
+  initialDistance = search.distance
+  numEvaluated, numApplied = search.run(timeLimit, maxIterations)
+  elapsed = time.time() - start
+  print(f'Local search applied {numApplied} of {numEvaluated} moves in {elapsed:.2f} seconds ({numEvaluated / max(elapsed, 1.0e-9):.0f} moves per second), reducing the distance from {initialDistance:.2f} to {search.distance:.2f}.')
+  return (vals[2] + search.distance, search.distance, vals[2], vals[3], vals[4]), search.getSolution()
+
+if __name__ == "__main__":
+
+  if len(sys.argv) < 5:
+    printUsage('Requires 4 arguments.')
+
+  network = Network(sys.argv[1])
+  tickHours = float(sys.argv[2])
+  tickZero = float(sys.argv[3])
+  trolleys = network.readTrolleys(sys.argv[4])
+
+  readTrucksFileName = None
+  writeTrucksFileName = None
+  timeLimit = 10
+  maxIterations = None
+  seed = 0
+  modifyTrolleysDeliverable = False
+  a = 5
+  while a < len(sys.argv):
+    arg = sys.argv[a]
+    if arg == '-i' and a+1 < len(sys.argv):
+      readTrucksFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-o' and a+1 < len(sys.argv):
+      writeTrucksFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-t' and a+1 < len(sys.argv):
+      timeLimit = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-n' and a+1 < len(sys.argv):
+      maxIterations = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-r' and a+1 < len(sys.argv):
+      seed = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-m':
+      modifyTrolleysDeliverable = True
+    else:
+      printUsage(f'Unprocessed argument <{arg}>.')
+    a += 1
+
+  network.setDiscretization(tickHours, tickZero)
+  mip = MIP(network, None, 1e4)
+  mip.setTimeHorizon(mip.prepareTrolleys(trolleys, modifyTrolleysDeliverable))
+
+  if readTrucksFileName is None:
+    from heuristic import construct_greedy
+    vals, solution = construct_greedy(mip)
+    print(f'Constructed a greedy solution with value {vals[0]:.2f}.')
+  else:
+    vals, solution = read_solution(readTrucksFileName)
+
+  vals, solution = improve_solution(mip, vals, solution, timeLimit, maxIterations, seed)
+  print(f'The improved solution has value {vals[0]} with total distance {vals[1]:.2f} and penalties {vals[2]:.1f} ({vals[3]:.1f} not produced and {vals[4]:.1f} not delivered).')
+  if writeTrucksFileName is not None:
+    write_solution(writeTrucksFileName, vals, solution, network.truckCapacity)
@@ -8,6 +8,7 @@ import math
 
 
 from common import * 
+from solutionfile import read_solution_file
 
 network = Network(sys.argv[1])
 outputFileName = sys.argv[2]
@@ -51,25 +52,23 @@ minTime = float('inf')
 maxTime = float('-inf')
 lastS = 0
 if len(sys.argv) > 3:
-  trucksFile = open(sys.argv[3], 'r')
-  for line in trucksFile.read().split('\n'):
-    split = line.split()
-    if split and split[0] == 'C':
-      source, target, time, num = int(split[1]), int(split[2]), float(split[3]), int(split[4])
-      if num > 0:
-        minTime = min(minTime, time)
-        maxTime = max(maxTime, time)
-        if not drawTimeRange or (time >= drawTimeRange[0] and time <= drawTimeRange[1]):
-          countConnections[source,target] = countConnections.get((source,target), 0) + num
+  solution = read_solution_file(sys.argv[3])
+  for source, target, time, num in solution.trucks.tolist():
+    if num > 0:
+      minTime = min(minTime, time)
+      maxTime = max(maxTime, time)
+      if not drawTimeRange or (time >= drawTimeRange[0] and time <= drawTimeRange[1]):
+        countConnections[source,target] = countConnections.get((source,target), 0) + num
+  lastTruck = None
+  for source, target, destination, shift, time, entry in solution.shipments.tolist():
+    if (source, target, time) != lastTruck:
       lastS = 0
-    if split and split[0] == 'S':
-      source, target, destination, shift, time, entry = int(split[1]), int(split[2]), int(split[3]), int(split[4]), float(split[5]), int(split[6])
-      num = entry - lastS # TODO: Due to a (by now fixed) bug, trolley numbers were aggregated in the output file.
-      if drawShift and drawShift[0] == destination and drawShift[1] == shift:
-        countShiftTrolleys[source,target] = countShiftTrolleys.get((source,target), 0) + num
-      lastS = entry
-      
-  trucksFile.close()
+      lastTruck = (source, target, time)
+    entry = math.ceil(round(entry, 2))
+    num = entry - lastS # TODO: Due to a (by now fixed) bug, trolley numbers were aggregated in the output file.
+    if drawShift and drawShift[0] == destination and drawShift[1] == shift:
+      countShiftTrolleys[source,target] = countShiftTrolleys.get((source,target), 0) + num
+    lastS = entry
 print(f'Times are in [{minTime},{maxTime}].')
 
 #plt.figure(figsize=(19.2, 10.8), dpi=500)
@@ -1,9 +1,20 @@
 import sys
-from gurobipy import *
+try:
+  import gurobipy
+  from gurobipy import *
+except ImportError:
+  gurobipy = None
+  from highsmodel import GRB
 from common import *
+from solutionfile import *
 import matplotlib.pyplot as plt
+import numpy as np
+import scipy.sparse
 import math
 import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from telemetry import Telemetry, finite
 
 def time2tick(time, timeshift, ticklen):
     return int((time - timeshift) / ticklen)
@@ -14,22 +25,71 @@ def printUsage(errorMessage=None):
   print(f'Usage: {sys.argv[0]} <network file name> <tickhours> <tickzero> <trolleys file name> [OPTIONS...]')
   print('Solves the MIP for network and trolleys, discretizing tickhours hours with offset tickzero hours.')
   print('Options:')
-  print('  -o FILE  Write used trucks to <FILE>.')  
+  print('  -o FILE  Write used trucks to <FILE>, in binary format if its name ends with .npz.')
   print('  -i FILE  Read used trucks from <FILE>.')
   print('  -t TIME  After a feasible solution was, the solve has TIME seconds for solving.')
   print('  -d DEV   Truck times may deviate up to DEV hours from the ones read from <FILE> to be considered allowed.')
   print('  -m       Modify trolleys to become deliverable instead of removing them.')
   print('  -c       Construct initial solution from that input file.')
+  print('  -v       Build variables and constraints in bulk via the matrix API.')
+  print('  -s NAME  Use solver NAME, which is either gurobi (default) or highs.')
+  print('  -p       Only create variables that are reachable from a trolley release and can reach a deadline.')
+  print('  -w NUM   With -v, build the per-commodity blocks in NUM processes.')
+  print('  -g       Start from a solution that routes trolleys directly or via one cross-dock.')
+  print('  -l TIME  With -g, improve that solution by local search for TIME seconds.')
+  print('  -f FILE  Write every new incumbent to <FILE> while solving.')
+  print('  -e FILE  Append the time and memory of each phase and the incumbent and bound over time to <FILE> as JSON lines.')
+  print('  -r WIN COMMIT  Solve windows of WIN hours that advance by COMMIT hours, each for at most TIME seconds.')
   sys.exit(1)
 
+def _flowVarBlock(travel, isCross, minTick, maxTick, targets, shifts, deadlines, forward, backward):
+  '''Returns index arrays (I, J, T, K) and names of the flow variables of the commodities; K indexes targets.'''
+  N = len(travel)
+  ticks = np.arange(minTick, maxTick+1)
+  heads = np.arange(N)
+  crossTravel = travel[:,targets][:,None,:]
+  blocks = []
+  for i in range(N):
+    arrival = (travel[i][:,None] + ticks[None,:])[:,:,None]
+    direct = (targets[None,None,:] == heads[:,None,None]) & (arrival <= deadlines[None,None,:])
+    viaCross = isCross[:,None,None] & (arrival + crossTravel <= deadlines[None,None,:])
+    mask = (arrival <= maxTick) & (direct | viaCross)
+    if not forward is None:
+      arrivalIndex = np.minimum(arrival - minTick, len(ticks) - 1)
+      mask &= forward[:,i,:].T[None,:,:]
+      mask &= backward[np.arange(len(targets))[None,None,:], heads[:,None,None], arrivalIndex]
+    J, T, K = np.nonzero(mask)
+    blocks.append((np.full(len(J), i), J, ticks[T], K))
+  I, J, T, K = (np.concatenate(arrays) for arrays in zip(*blocks))
+  names = [ f'y#{i}#{j}#{t}#{target}#{shift}' for i,j,t,target,shift in zip(I.tolist(), J.tolist(), T.tolist(), targets[K].tolist(), shifts[K].tolist()) ]
+  return I, J, T, K, names
+
+def _inventoryVarBlock(N, minTick, maxTick, targets, shifts, forward, backward):
+  '''Returns index arrays (I, T, K) and names of the inventory variables of the commodities; K indexes targets.'''
+  I, T, K = np.meshgrid(np.arange(N), np.arange(minTick, maxTick), np.arange(len(targets)), indexing='ij')
+  I, T, K = I.ravel(), T.ravel(), K.ravel()
+  if not forward is None:
+    useful = forward[K,I,T-minTick] & backward[K,I,T+1-minTick]
+    I, T, K = I[useful], T[useful], K[useful]
+  names = [ f'z#{i}#{t}#{target}#{shift}' for i,t,target,shift in zip(I.tolist(), T.tolist(), targets[K].tolist(), shifts[K].tolist()) ]
+  return I, T, K, names
+
 class MIP:
   
-  def __init__(self, network, readTrucksFileName, allowedTruckDeviation):
+  def __init__(self, network, readTrucksFileName, allowedTruckDeviation, vectorized=False, solver='gurobi', threads=4, incremental=False, workers=None):
     self._vtypeFlow = GRB.CONTINUOUS
     self._vtypeInventory = GRB.CONTINUOUS
 
-    self._model = Model('PostNL')
-    self._model.params.threads = 4
+    # The solver API is either gurobipy or highsmodel, which provides the same subset of gurobipy on top of HiGHS.
+    if solver == 'highs':
+      import highsmodel
+      self._api = highsmodel
+    elif solver == 'gurobi' and gurobipy is not None:
+      self._api = gurobipy
+    else:
+      raise ValueError(f'Solver <{solver}> is not available.')
+    self._model = self._api.Model('PostNL')
+    self._model.params.threads = threads
     self._model.params.startNodeLimit = 1
     self._model.params.MIPFocus = 1
     self._network = network
@@ -45,6 +105,9 @@ class MIP:
     self._arcs = [ (i,j) for i in self._nodes for j in self._nodes ]
     self._varTruck = {}
     self._varFlow = {}
+    self._flowsOut = {}
+    self._flowsIn = {}
+    self._flowsOnArc = {}
     self._varInventory = {}
     self._varNotDelivered = {}
     self._varNotProduced = {}
@@ -53,6 +116,22 @@ class MIP:
     self._undeliveredPenalty = 10
     self._extendedCapacityCost = 10
     self._extraDockPenalty = 10
+    self._vectorized = vectorized
+    self._truckTable = None
+    self._forwardReachable = None
+    self._backwardReachable = None
+    self._usefulTrucks = None
+    self._flowTable = None
+    self._inventoryTable = None
+    self._incremental = incremental # Also create variables for disallowed trucks such that they can be allowed later.
+    self._workers = workers # Number of processes that build the per-commodity blocks of the matrix builder.
+    self._openEnd = False # Whether commodities that are due after the last tick may remain in inventory.
+    self._trolleyCounts = None
+    self._truckBounds = None # Upper bounds of the truck variables before fixTrucks was called first.
+    self._solutionTable = None # Variables and their keys as arrays for fetching solution values in bulk.
+    self._solutionWriter = None # Background writer of new incumbents, see streamSolutions.
+    self._streamVars = None
+    self._telemetry = None # Receives phase timings and the solver trajectory, see setTelemetry.
 
     self._allowedTruckDeviation = allowedTruckDeviation
     self.readAllowedTrucks(readTrucksFileName)
@@ -61,32 +140,242 @@ class MIP:
     if readTrucksFileName is None:
       self._allowedTrucks = None
     else:
-      self._allowedTrucks = {}
-
-      f = open(readTrucksFileName, 'r')
-      for line in f:
-        if not line.startswith('T'):
-          continue
-        split = line.split()
-        source, target, time = int(split[1]), int(split[2]), float(split[3])
-        if (source,target) in self._allowedTrucks:
-          self._allowedTrucks[source,target].add(time)
-        else:
-          self._allowedTrucks[source,target] = set([time])
-      f.close()
-
-  def setTimeHorizon(self, trolleys):
-    for t in trolleys:
-      tick = self.network.trolleyReleaseTick(t)
+      trucks = read_solution_file(readTrucksFileName).trucks
+      self.setAllowedTrucks(zip(trucks['source'].tolist(), trucks['target'].tolist(), trucks['time'].tolist()))
+
+  def setAllowedTrucks(self, trucks):
+    '''Allows only trucks close to the given (source, target, time) triples, e.g., those of a previous solution.'''
+    times = {}
+    for source,target,time in trucks:
+      if (source,target) in times:
+        times[source,target].add(time)
+      else:
+        times[source,target] = set([time])
+
+    # Sorted arrays allow to find the closest allowed time by binary search.
+    self._allowedTrucks = { arc: np.array(sorted(arcTimes)) for arc,arcTimes in times.items() }
+
+  def allowedTruckMask(self, i, j, ticks):
+    '''Returns for each of the ticks whether a truck from i to j at that tick is close enough to an allowed truck.'''
+    ticks = np.asarray(ticks)
+    if self._allowedTrucks is None:
+      return np.ones(len(ticks), dtype=bool)
+    if not (i,j) in self._allowedTrucks:
+      return np.zeros(len(ticks), dtype=bool)
+    times = self._allowedTrucks[i,j]
+    tickTimes = self.network.tickTime(ticks)
+    after = np.searchsorted(times, tickTimes)
+    before = np.maximum(after - 1, 0)
+    after = np.minimum(after, len(times) - 1)
+    dist = np.minimum(np.abs(tickTimes - times[before]), np.abs(tickTimes - times[after]))
+    return dist <= self._allowedTruckDeviation
+
+  def isTruckAllowed(self, i, j, t):
+    '''Returns whether a truck from i to j at tick t is close enough to an allowed truck.'''
+    return bool(self.allowedTruckMask(i, j, [t])[0])
+
+  def applyAllowedTrucks(self, allowedTruckDeviation):
+    '''Changes the truck bounds in place to the allowed trucks and clears all starts; requires incremental=True.'''
+    assert self._incremental
+    self._allowedTruckDeviation = allowedTruckDeviation
+    numAllowed = 0
+    ticks = np.array(self.ticks)
+    for (i,j) in self.arcs:
+      allowed = self.allowedTruckMask(i, j, ticks)
+      for t in self.ticks:
+        var = self._varTruck.get((i,j,t))
+        if var is not None and not isinstance(var, float):
+          if allowed[t - self._minTick]:
+            var.ub = 9999.0
+            numAllowed += 1
+          else:
+            var.ub = 0.0
+          var.start = GRB.UNDEFINED
+    for var in self._varFlow.values():
+      var.start = GRB.UNDEFINED
+    self._model.update()
+    print(f'Allowed {numAllowed} truck variables.')
+
+  def neighbourhood(self, kind, rng, flows, size=0.2):
+    '''Returns the keys (i, j, tick) of the trucks that an LNS step frees for kind 'depot', 'window' or 'commodity'.'''
+    keys = [ key for key,var in self._varTruck.items() if not isinstance(var, float) ]
+    if kind == 'depot':
+      node = rng.choice(self.nodes)
+      return set( (i,j,t) for i,j,t in keys if i == node or j == node )
+    elif kind == 'window':
+      length = max(1, int(round(size * len(self.ticks))))
+      first = rng.randint(self._minTick, max(self._minTick, self._maxTick - length + 1))
+      return set( (i,j,t) for i,j,t in keys if first <= t < first + length )
+    elif kind == 'commodity':
+      target = rng.choice(self.nodes)
+      arcs = set( (i,j) for i,j,time,commodityTarget,shift in flows if commodityTarget == target )
+      return set( (i,j,t) for i,j,t in keys if j == target or (i,j) in arcs )
+    raise ValueError(f'Unknown neighbourhood <{kind}>.')
+
+  def fixTrucks(self, trucks, free):
+    '''Fixes all trucks to their numbers in trucks except those in free; releaseTrucks undoes this.'''
+    if self._truckBounds is None:
+      self._truckBounds = { key: var.ub for key,var in self._varTruck.items() if not isinstance(var, float) }
+    tickTime = self.network.tickTime
+    for (i,j,t),ub in self._truckBounds.items():
+      var = self._varTruck[i,j,t]
+      if (i,j,t) in free:
+        var.lb = 0.0
+        var.ub = ub
+      else:
+        count = min(trucks.get((i,j,tickTime(t)), 0), ub)
+        var.lb = count
+        var.ub = count
+    self._model.update()
+
+  def releaseTrucks(self):
+    '''Restores the bounds of the truck variables changed by fixTrucks.'''
+    if self._truckBounds is None:
+      return
+    for key,ub in self._truckBounds.items():
+      self._varTruck[key].lb = 0.0
+      self._varTruck[key].ub = ub
+    self._truckBounds = None
+    self._model.update()
+
+  def solveNeighbourhood(self, trucks, flows, free, timeLimit):
+    '''Solves with all trucks except those in free fixed to the solution, which is also the start.
+    Returns (vals, solution), or None if no solution was found.'''
+    self.fixTrucks(trucks, free)
+    self.constructInitialSolutionFrom(trucks, flows, complete=True)
+    self.setSollimit(2000000000)
+    self.setTimelimit(timeLimit)
+    self.optimize()
+    if self.getSolCount() == 0:
+      return None
+    return self.getSolutionValue(), self.getSolution()
+
+  def trolleyCounts(self, trolleys):
+    '''Returns the numbers of trolleys per (source, release tick, target, shift) of trolleys or such counts.'''
+    if isinstance(trolleys, dict):
+      return trolleys
+    return self.network.countTrolleys(trolleys)
+
+  def prepareTrolleys(self, trolleys, modifyTrolleysDeliverable):
+    '''Removes trolleys that need no transport, makes the others deliverable or removes them, and returns the counts.'''
+    if isinstance(trolleys, TrolleySet):
+      requiredTrolleys = trolleys[trolleys.sources != trolleys.targets]
+    else:
+      requiredTrolleys = [ t for t in trolleys if t.source != t.commodity[0] ]
+    print(f'Removed {len(trolleys) - len(requiredTrolleys)} trolleys having equal origin and destination.')
+
+    if modifyTrolleysDeliverable:
+      trolleys,numModifications = self.makeTrolleysDeliverable(requiredTrolleys)
+      print(f'Modified {numModifications} trolley release times to make them deliverable.')
+    else:
+      trolleys = self.filterDeliverableTrolleys(requiredTrolleys)
+      print(f'Kept {len(trolleys)} of {len(requiredTrolleys)} deliverable trolleys.')
+    self._trolleyCounts = self.trolleyCounts(trolleys)
+    return self._trolleyCounts
+
+  def createModel(self, trolleyCounts, relaxCapacity=False):
+    '''Creates all variables and constraints for the given trolley counts.'''
+    with self.phase('createTruckVars'):
+      self.createTruckVars(forFree=False)
+    with self.phase('createFlowVars'):
+      self.createFlowVars()
+    with self.phase('createInventoryVars'):
+      self.createInventoryVars()
+    with self.phase('createExtraDocksVars'):
+      self.createExtraDocksVars()
+    with self.phase('createNotDeliveredVars'):
+      self.createNotDeliveredVars()
+    with self.phase('createNotProducedVars'):
+      self.createNotProducedVars(trolleyCounts)
+    with self.phase('createExtendedCapacityVars'):
+      self.createExtendedCapacityVars()
+    if not relaxCapacity:
+      with self.phase('createCapacityConstraints'):
+        self.createCapacityConstraints()
+    with self.phase('createSourceCapacityConstraints'):
+      self.createSourceCapacityConstraints()
+    with self.phase('createTargetCapacityConstraints'):
+      self.createTargetCapacityConstraints()
+    with self.phase('createFlowBalanceConstraints'):
+      self.createFlowBalanceConstraints(trolleyCounts)
+    with self.phase('createDockingConstraints'):
+      self.createDockingConstraints()
+
+  def setTimeHorizon(self, trolleys, window=None):
+    '''Extends the ticks to all trolley releases, or sets them to the window (first tick, last tick) if given.'''
+    if window is not None:
+      self._minTick, self._maxTick = window
+      self._openEnd = True
+      return
+    for tick in set( releaseTick for source,releaseTick,target,shift in self.trolleyCounts(trolleys) ):
       if tick < self._minTick:
         self._minTick = tick
       if tick > self._maxTick:
         self._maxTick = tick
 
+  def computeReachability(self, trolleys):
+    '''Sweeps forward from the releases and backward from the deadlines, such that only variables on
+    a path from a release to a deadline are created.'''
+    print('Computing reachable part of the time-expanded network.')
+    N = len(self.nodes)
+    numTicks = self._maxTick - self._minTick + 1
+    travel = self.network.travelTickMatrix
+    commodities = list(self.network.commodities)
+    commodityIndex = { k: c for c,k in enumerate(commodities) }
+    isCross = np.array([ self.network.isCross(j) for j in self.nodes ], dtype=bool)
+    self._forwardReachable = np.zeros((len(commodities), N, numTicks), dtype=bool)
+    self._backwardReachable = np.zeros((len(commodities), N, numTicks), dtype=bool)
+    self._usefulTrucks = np.zeros((N, N, numTicks), dtype=bool)
+    for source,releaseTick,target,shift in self.trolleyCounts(trolleys):
+      self._forwardReachable[commodityIndex[target,shift], source, releaseTick - self._minTick] = True
+    for c,(target,shift) in enumerate(commodities):
+      deadline = self.network.deadlineTick((target,shift)) - self._minTick
+
+      # Latest (relative) arrival tick at each node for which createFlowVars creates flow variables.
+      lastArrival = np.where(isCross, deadline - travel[:,target], -1)
+      lastArrival[target] = max(lastArrival[target], deadline)
+      lastArrival = np.minimum(lastArrival, numTicks - 1)
+
+      forward = self._forwardReachable[c]
+      for t in range(numTicks):
+        if t > 0:
+          forward[:,t] |= forward[:,t-1]
+        tails = np.nonzero(forward[:,t])[0]
+        arrival = t + travel[tails,:]
+        ii, jj = np.nonzero(arrival <= lastArrival[None,:])
+        forward[jj, arrival[ii,jj]] = True
+
+      backward = self._backwardReachable[c]
+      backward[target, deadline] = True
+      for t in reversed(range(numTicks)):
+        if t + 1 < numTicks:
+          backward[:,t] |= backward[:,t+1]
+        arrival = t + travel
+        ii, jj = np.nonzero(arrival <= lastArrival[None,:])
+        useful = backward[jj, arrival[ii,jj]]
+        backward[ii[useful], t] = True
+        useful &= forward[ii,t]
+        self._usefulTrucks[ii[useful], jj[useful], t] = True
+    print(f'Trucks are useful for {self._usefulTrucks.sum()} of {self._usefulTrucks.size} arcs and ticks.')
+
+  def _trolleySetSlack(self, trolleys):
+    '''Returns, for every trolley of a TrolleySet, the number of ticks between its earliest arrival and its deadline.'''
+    network = self.network
+    return network.deadlineTicks(trolleys.targets, trolleys.shifts) - network.trolleyReleaseTicks(trolleys.releases) - network.travelTickMatrix[trolleys.sources, trolleys.targets]
+
   def filterDeliverableTrolleys(self, trolleys):
+    if isinstance(trolleys, TrolleySet):
+      return trolleys[self._trolleySetSlack(trolleys) >= 0]
     return [ t for t in trolleys if self.network.trolleyReleaseTick(t) + self.network.travelTicks(t.source, t.commodity[0]) <= self.network.deadlineTick(t.commodity) ]
 
   def makeTrolleysDeliverable(self, trolleys):
+    if isinstance(trolleys, TrolleySet):
+      modify = self._trolleySetSlack(trolleys) < 0
+      releases = trolleys.releases.copy()
+      releases[modify] = self.network.tickTime( self.network.deadlineTicks(trolleys.targets[modify], trolleys.shifts[modify]) - self.network.travelTickMatrix[trolleys.sources[modify], trolleys.targets[modify]] )
+      modifiedTrolleys = TrolleySet(trolleys.sources, trolleys.targets, trolleys.shifts, releases)
+      assert np.all(self._trolleySetSlack(modifiedTrolleys) >= 0)
+      return modifiedTrolleys, int(modify.sum())
     modifiedTrolleys = []
     countModifications = 0
     for t in trolleys:
@@ -118,6 +407,22 @@ class MIP:
   def truckvars(self):
     return self._varTruck
 
+  @property
+  def flowvars(self):
+    return self._varFlow
+
+  @property
+  def trolleycounts(self):
+    return self._trolleyCounts
+
+  @property
+  def undeliveredPenalty(self):
+    return self._undeliveredPenalty
+
+  @property
+  def extraDockPenalty(self):
+    return self._extraDockPenalty
+
   @property
   def mintick(self):
     return self._minTick
@@ -128,24 +433,24 @@ class MIP:
 
   def createTruckVars(self, forFree=False):
     print('Creating truck variables.')
+    if self._vectorized:
+      return self.createTruckVarsMatrix(forFree)
     self._varTruck = {}
+    ticks = np.array(self.ticks)
     for (i,j) in self.arcs:
+      allowed = self.allowedTruckMask(i, j, ticks)
       for t in self.ticks:
-        if t + self.network.travelTicks(i,j) <= max(self.ticks):
+        if t + self.network.travelTicks(i,j) <= self._maxTick:
           obj = self.network.distance(i,j)
           ub = 9999.0
           if forFree:
             obj = 0.0
-          if not self._allowedTrucks is None:
-            if not (i,j) in self._allowedTrucks:
-#              print(f'Disallowing truck route from {i} to {j} completely.')
-              ub = 0.0
-            else:
-              dist = min( math.fabs(self.network.tickTime(t) - at) for at in self._allowedTrucks[i,j])
-              if dist > self._allowedTruckDeviation:
-#                print(f'Disallowing truck route from {i} to {j} at tick {t} = time {self._network.tickTime(t)} because of distance {dist}.')
-                ub = 0.0
-          if ub > 0.0:
+          if not allowed[t - self._minTick]:
+            ub = 0.0
+          create = ub > 0.0 or self._incremental
+          if not self._usefulTrucks is None and not self._usefulTrucks[i,j,t-self._minTick]:
+            create = False
+          if create:
             self._varTruck[i,j,t] = self._model.addVar(name=f'x#{i}#{j}#{t}', vtype=GRB.INTEGER, obj=obj, ub=ub)
           else:
             self._varTruck[i,j,t] = 0.0 # We still add the dict entry since some loops go through its keys.
@@ -167,27 +472,50 @@ class MIP:
 
   def createFlowVars(self):
     print('Creating flow variables.')
+    if self._vectorized:
+      return self.createFlowVarsMatrix()
     self._varFlow = {}
+    self._flowsOut = {}
+    self._flowsIn = {}
+    self._flowsOnArc = {}
     for (i,j) in self.arcs:
       for t in self.ticks:
-        if t + self.network.travelTicks(i,j) <= max(self.ticks):
-          for target,shift in self.network.commodities:
-            if (target == j and t + self.network.travelTicks(i,j) <= self.network.deadlineTick((target,shift))) or (self.network.isCross(j) and t + self.network.travelTicks(i,j) + self.network.travelTicks(j,target) <= self.network.deadlineTick((target,shift))):
-              self._varFlow[i,j,t,target,shift] = self._model.addVar(name=f'y#{i}#{j}#{t}#{target}#{shift}', vtype=self._vtypeFlow)
+        arrival = t + self.network.travelTicks(i,j)
+        if arrival <= self._maxTick:
+          for c,(target,shift) in enumerate(self.network.commodities):
+            if not self._forwardReachable is None and not (self._forwardReachable[c,i,t-self._minTick] and self._backwardReachable[c,j,arrival-self._minTick]):
+              continue
+            if (target == j and arrival <= self.network.deadlineTick((target,shift))) or (self.network.isCross(j) and arrival + self.network.travelTicks(j,target) <= self.network.deadlineTick((target,shift))):
+              var = self._model.addVar(name=f'y#{i}#{j}#{t}#{target}#{shift}', vtype=self._vtypeFlow)
+              self._varFlow[i,j,t,target,shift] = var
+              self._flowsOut.setdefault((i,t,target,shift), []).append(var)
+              self._flowsIn.setdefault((j,arrival,target,shift), []).append(var)
+              self._flowsOnArc.setdefault((i,j,t), []).append(var)
     self._model.update()
 
   def createInventoryVars(self):
     print('Creating inventory variables.')
+    if self._vectorized:
+      return self.createInventoryVarsMatrix()
     self._varInventory = {}
     for i in self.nodes:
       for t in self.ticks:
-        for target,shift in self.network.commodities:
+        for c,(target,shift) in enumerate(self.network.commodities):
+          if t == self._maxTick and self._openEnd and self.network.deadlineTick((target,shift)) > t:
+            self._varInventory[i,t,target,shift] = self._model.addVar(name=f'z#{i}#{t}#{target}#{shift}', vtype=self._vtypeInventory, obj=self.terminalInventoryCost(i,target))
+            continue
           obj = 1.0e5 if t == max(self.ticks) else 0.0
           ub = 0 if t == max(self.ticks) else GRB.INFINITY
+          if ub > 0 and not self._forwardReachable is None and not (self._forwardReachable[c,i,t-self._minTick] and self._backwardReachable[c,i,t+1-self._minTick]):
+            ub = 0
           if ub > 0:
             self._varInventory[i,t,target,shift] = self._model.addVar(name=f'z#{i}#{t}#{target}#{shift}', vtype=self._vtypeInventory, obj=obj, ub=ub)
     self._model.update()
 
+  def terminalInventoryCost(self, i, target):
+    '''Values a trolley that remains at i after the last tick by its share of a direct truck to its target.'''
+    return self.network.distance(i,target) / self.network.truckCapacity if i != target else 0.0
+
   def createNotDeliveredVars(self):
     print('Creating non-delivery variables.')
     self._varNotDelivered = {}
@@ -197,12 +525,7 @@ class MIP:
 
   def createNotProducedVars(self, trolleys):
     print('Creating non-production variables.')
-    production = {}
-    demand = {}
-    for t in trolleys:
-      releaseTick = self.network.trolleyReleaseTick(t)
-      production[t.source, releaseTick, t.commodity[0], t.commodity[1]] = production.get((t.source, releaseTick, t.commodity[0], t.commodity[1]), 0) + 1
-      demand[t.commodity] = demand.get(t.commodity, 0) + 1
+    production = self.trolleyCounts(trolleys)
 
     self._varNotProduced = {}
     for i in self.nodes:
@@ -220,32 +543,47 @@ class MIP:
 
   def createCapacityConstraints(self):
     print('Creating truck capacity constraints.')
-    for (i,j) in self.arcs:
-      for t in self.ticks:
-        if (i,j,t) in self._varTruck:
-          self._model.addConstr( quicksum( self._varFlow[i,j,t,target,shift] for (target,shift) in self.network.commodities if (i,j,t,target,shift) in self._varFlow ) <= self.network.truckCapacity * self._varTruck[i,j,t], f'capacity#{i}#{j}#{t}')
+    if self._vectorized:
+      return self.createCapacityConstraintsMatrix()
+    for (i,j,t),truck in self._varTruck.items():
+      if isinstance(truck, float) and not (i,j,t) in self._flowsOnArc:
+        continue
+      self._model.addConstr( self._api.quicksum( self._flowsOnArc.get((i,j,t), []) ) <= self.network.truckCapacity * truck, f'capacity#{i}#{j}#{t}')
 
   def createDockingConstraints(self):
     print('Creating docking capacity constraints.')
+    if self._vectorized:
+      return self.createDockingConstraintsMatrix()
     loadingTicks = self.network.loadingTicks
     unloadingTicks = self.network.unloadingTicks
+
+    # Every truck occupies a dock at its origin during the loading window and at its destination during the
+    # unloading window. We assign it to the rows of these windows once instead of searching for it per row.
+    departing = {}
+    arriving = {}
+    for (i,j,s),truck in self._varTruck.items():
+      for t in range(s, s + loadingTicks):
+        if (i,j,t) in self._varTruck:
+          departing.setdefault((i,t), []).append(truck)
+      unloadingStart = s + self.network.travelTicks(i,j) - unloadingTicks
+      for t in range(unloadingStart, unloadingStart + unloadingTicks):
+        arriving.setdefault((j,t), []).append(truck)
+
     for i in self.nodes:
+      extraDocks = 0
+      if i in self._varExtraDocks:
+        extraDocks = self._varExtraDocks[i]
       for t in self.ticks:
-        departing = quicksum( self._varTruck[i,j,t-eta] for j in self.nodes for eta in range(loadingTicks) if (i,j,t) in self._varTruck )
-        arriving = quicksum( self._varTruck[j,i,t-self.network.travelTicks(j,i)+unloadingTicks-eta] for j in self.nodes for eta in range(unloadingTicks) if (j,i,t-self.network.travelTicks(j,i)+unloadingTicks-eta) in self._varTruck )
-        extraDocks = 0
-        if i in self._varExtraDocks:
-          extraDocks = self._varExtraDocks[i]
-        self._model.addConstr( departing + arriving <= self.network.numDocksPerTick(i) + extraDocks, f'docking#{i}#{t}')
+        self._model.addConstr( self._api.quicksum( departing.get((i,t), []) ) + self._api.quicksum( arriving.get((i,t), []) ) <= self.network.numDocksPerTick(i) + extraDocks, f'docking#{i}#{t}')
 
   def createFlowBalanceConstraints(self, trolleys):
     print('Creating flow balance constraints.')
-    production = {}
+    if self._vectorized:
+      return self.createFlowBalanceConstraintsMatrix(trolleys)
+    production = self.trolleyCounts(trolleys)
     demand = {}
-    for t in trolleys:
-      releaseTick = self.network.trolleyReleaseTick(t)
-      production[t.source, releaseTick, t.commodity[0], t.commodity[1]] = production.get((t.source, releaseTick, t.commodity[0], t.commodity[1]), 0) + 1
-      demand[t.commodity] = demand.get(t.commodity, 0) + 1
+    for (source,releaseTick,target,shift),count in production.items():
+      demand[target,shift] = demand.get((target,shift), 0) + count
 
     loadingTicks = self.network.loadingTicks
     unloadingTicks = self.network.unloadingTicks
@@ -255,10 +593,15 @@ class MIP:
         for target,shift in self.network.commodities:
           oldInventory = self._varInventory.get((i,t-1,target,shift), 0.0)
           newInventory = self._varInventory.get((i,t,target,shift), 0.0)
-          outFlow = quicksum( self._varFlow.get((i,j,t,target,shift), 0.0) for j in self.nodes if t+self.network.travelTicks(i,j) in self.ticks)
-          inFlow = quicksum( self._varFlow.get((j,i,t-self.network.travelTicks(j,i),target,shift), 0.0) for j in self.nodes )
+          outFlows = self._flowsOut.get((i,t,target,shift), [])
+          inFlows = self._flowsIn.get((i,t,target,shift), [])
           produced = production.get((i,t,target,shift), 0)
-          sumRhs += produced
+          if produced == 0 and not outFlows and not inFlows and isinstance(oldInventory, float) and isinstance(newInventory, float) and not (i == target and t == self.network.deadlineTick((target,shift))):
+            continue
+          outFlow = self._api.quicksum( outFlows )
+          inFlow = self._api.quicksum( inFlows )
+          if self.network.deadlineTick((target,shift)) <= self._maxTick:
+            sumRhs += produced
           if i == target and t == self.network.deadlineTick((target,shift)):
             consumed = demand.get((target,shift), 0) - self._varNotDelivered.get((target,shift), 0.0)
             sumRhs -= demand.get((target,shift), 0)
@@ -268,23 +611,235 @@ class MIP:
             self._varNotProduced[i,t,target,shift].ub = produced
             produced = produced - self._varNotProduced[i,t,target,shift]
           self._model.addConstr( newInventory - oldInventory + outFlow - inFlow == produced - consumed, f'flow_balance#{i}#{t}#{target}#{shift}')
-    if sumRhs != 0:
+    if abs(sumRhs) > 1.0e-6:
       assert 'Total flow balance of network is nonzero!' == None
 
   def createSourceCapacityConstraints(self):
     print('Creating source capacity constraints.')
+    if self._vectorized:
+      return self.createStorageCapacityConstraintsMatrix(True)
     for i in self.nodes:
       for t in self.ticks:
         # for non-crossdocks: total inventory of commodities with difference destination <= 400
         # for crossdocks: total inventory of commodities with difference destination <= 400 + big number
-        self._model.addConstr( quicksum( self._varInventory.get((i,t,target,shift), 0.0) for target,shift in self.network.commodities if target != i) <= self.network.sourceCapacity(i) + self.network.crossCapacity(i))
+        self._model.addConstr( self._api.quicksum( self._varInventory.get((i,t,target,shift), 0.0) for target,shift in self.network.commodities if target != i) <= self.network.sourceCapacity(i) + self.network.crossCapacity(i))
     
   def createTargetCapacityConstraints(self):
     print('Creating target capacity constraints.')
+    if self._vectorized:
+      return self.createStorageCapacityConstraintsMatrix(False)
     for i in self.nodes:
       for t in self.ticks:
         # inventory of all commodities with this location as destination <= 1200
-        self._model.addConstr( quicksum( self._varInventory.get((i,t,target,shift), 0.0) for target,shift in self.network.commodities if target == i) <= self.network.targetCapacity(i) )
+        self._model.addConstr( self._api.quicksum( self._varInventory.get((i,t,target,shift), 0.0) for target,shift in self.network.commodities if target == i) <= self.network.targetCapacity(i) )
+
+  # Matrix-based builder: index sets are computed with NumPy and variables and constraints are added in bulk.
+  # The dictionaries _varTruck, _varFlow and _varInventory are filled as well, such that the remaining code works unchanged.
+
+  def _distanceMatrix(self):
+    return np.array([ [ self.network.distance(i,j) for j in self.nodes ] for i in self.nodes ], dtype=float)
+
+  def _commodityArrays(self):
+    commodities = list(self.network.commodities)
+    targets = np.array([ target for target,shift in commodities ], dtype=int)
+    shifts = np.array([ shift for target,shift in commodities ], dtype=int)
+    deadlines = self.network.deadlineTickArray
+    return commodities, targets, shifts, deadlines
+
+  def _addMatrixVars(self, count, **kwargs):
+    if count == 0:
+      return [], np.zeros(0, dtype=int)
+    variables = self._model.addMVar(count, **kwargs).tolist()
+    self._model.update()
+    return variables, variables[0].index + np.arange(count)
+
+  def _addMatrixConstrs(self, rows, cols, coefs, sense, rhs, names=None, dropEmpty=False):
+    self._model.update()
+    if dropEmpty:
+      keep = (np.bincount(rows, minlength=len(rhs)) > 0) | (rhs != 0)
+      rows = (np.cumsum(keep) - 1)[rows]
+      rhs = rhs[keep]
+      if names is not None:
+        names = [ name for name,k in zip(names, keep.tolist()) if k ]
+    A = scipy.sparse.csr_matrix((coefs, (rows, cols)), shape=(len(rhs), self._model.NumVars))
+    if names is None:
+      self._model.addMConstr(A, self._api.MVar.fromlist(self._model.getVars()), sense, rhs)
+    else:
+      self._model.addMConstr(A, self._api.MVar.fromlist(self._model.getVars()), sense, rhs, name=names)
+
+  def createTruckVarsMatrix(self, forFree=False):
+    N = len(self.nodes)
+    travel = self.network.travelTickMatrix
+    I, J, T = np.meshgrid(np.arange(N), np.arange(N), np.arange(self._minTick, self._maxTick+1), indexing='ij')
+    mask = T + travel[I,J] <= self._maxTick
+    I, J, T = I[mask], J[mask], T[mask]
+    obj = np.zeros(len(I)) if forFree else self._distanceMatrix()[I,J]
+    ub = np.full(len(I), 9999.0)
+    if not self._allowedTrucks is None:
+      arcIds = I * N + J
+      allowed = np.zeros(len(I), dtype=bool)
+      for (i,j) in self._allowedTrucks:
+        first, beyond = np.searchsorted(arcIds, [i*N + j, i*N + j + 1])
+        allowed[first:beyond] = self.allowedTruckMask(i, j, T[first:beyond])
+      ub[~allowed] = 0.0
+    create = (ub > 0.0) | self._incremental
+    if not self._usefulTrucks is None:
+      create &= self._usefulTrucks[I,J,T-self._minTick]
+    names = [ f'x#{i}#{j}#{t}' for i,j,t in zip(I[create].tolist(), J[create].tolist(), T[create].tolist()) ]
+    variables, cols = self._addMatrixVars(len(names), vtype=GRB.INTEGER, obj=obj[create], ub=ub[create], name=names)
+    self._varTruck = dict.fromkeys(zip(I.tolist(), J.tolist(), T.tolist()), 0.0) # We still add the dict entry since some loops go through its keys.
+    self._varTruck.update(zip(zip(I[create].tolist(), J[create].tolist(), T[create].tolist()), variables))
+    col = np.full(len(I), -1)
+    col[create] = cols
+    self._truckTable = (I, J, T, col)
+
+  def _buildCommodityBlocks(self, function, shared, perCommodity):
+    '''Calls function(*shared, *perCommodity) for all commodities, in chunks if workers are set, and merges
+    the blocks in sorted order.'''
+    if self._workers is None or self._workers <= 1:
+      return function(*shared, *perCommodity)
+
+    chunks = [ chunk for chunk in np.array_split(np.arange(len(perCommodity[0])), 4 * self._workers) if len(chunk) > 0 ]
+    with ProcessPoolExecutor(max_workers=self._workers) as pool:
+      futures = [ pool.submit(function, *shared, *(None if a is None else a[chunk] for a in perCommodity)) for chunk in chunks ]
+      results = [ future.result() for future in futures ]
+    numArrays = len(results[0]) - 1
+    arrays = [ np.concatenate([ result[a] for result in results ]) for a in range(numArrays - 1) ]
+    arrays.append(np.concatenate([ chunk[result[numArrays - 1]] for chunk,result in zip(chunks, results) ]))
+    names = [ name for result in results for name in result[-1] ]
+    order = np.lexsort(arrays[::-1])
+    return tuple(array[order] for array in arrays) + ([ names[o] for o in order.tolist() ],)
+
+  def createFlowVarsMatrix(self):
+    travel = self.network.travelTickMatrix
+    commodities, targets, shifts, deadlines = self._commodityArrays()
+    isCross = np.array([ self.network.isCross(j) for j in self.nodes ], dtype=bool)
+    I, J, T, K, names = self._buildCommodityBlocks(_flowVarBlock, (travel, isCross, self._minTick, self._maxTick),
+      (targets, shifts, deadlines, self._forwardReachable, self._backwardReachable))
+    keys = list(zip(I.tolist(), J.tolist(), T.tolist(), targets[K].tolist(), shifts[K].tolist()))
+    variables, cols = self._addMatrixVars(len(keys), vtype=self._vtypeFlow, name=names)
+    self._varFlow = dict(zip(keys, variables))
+    self._flowTable = (I, J, T, K, cols)
+
+  def createInventoryVarsMatrix(self):
+    commodities, targets, shifts, deadlines = self._commodityArrays()
+    I, T, K, names = self._buildCommodityBlocks(_inventoryVarBlock, (len(self.nodes), self._minTick, self._maxTick),
+      (targets, shifts, self._forwardReachable, self._backwardReachable))
+    obj = np.zeros(len(I))
+    if self._openEnd:
+      terminalI, terminalK = np.meshgrid(np.arange(len(self.nodes)), np.nonzero(deadlines > self._maxTick)[0], indexing='ij')
+      terminalI, terminalK = terminalI.ravel(), terminalK.ravel()
+      terminalT = np.full(len(terminalI), self._maxTick)
+      I, T, K = np.concatenate((I, terminalI)), np.concatenate((T, terminalT)), np.concatenate((K, terminalK))
+      names = names + [ f'z#{i}#{t}#{target}#{shift}' for i,t,target,shift in zip(terminalI.tolist(), terminalT.tolist(), targets[terminalK].tolist(), shifts[terminalK].tolist()) ]
+      obj = np.concatenate((obj, [ self.terminalInventoryCost(i,target) for i,target in zip(terminalI.tolist(), targets[terminalK].tolist()) ]))
+      order = np.lexsort((K, T, I))
+      I, T, K, obj = I[order], T[order], K[order], obj[order]
+      names = [ names[o] for o in order.tolist() ]
+    keys = list(zip(I.tolist(), T.tolist(), targets[K].tolist(), shifts[K].tolist()))
+    variables, cols = self._addMatrixVars(len(keys), vtype=self._vtypeInventory, obj=obj, name=names)
+    self._varInventory = dict(zip(keys, variables))
+    self._inventoryTable = (I, T, K, cols)
+
+  def createCapacityConstraintsMatrix(self):
+    N = len(self.nodes)
+    numTicks = self._maxTick - self._minTick + 1
+    I, J, T, col = self._truckTable
+    arcTickIds = (I * N + J) * numTicks + T - self._minTick
+    fI, fJ, fT, fK, fCol = self._flowTable
+    flowRows = np.searchsorted(arcTickIds, (fI * N + fJ) * numTicks + fT - self._minTick)
+    truckRows = np.nonzero(col >= 0)[0]
+    rows = np.concatenate((flowRows, truckRows))
+    cols = np.concatenate((fCol, col[truckRows]))
+    coefs = np.concatenate((np.ones(len(fCol)), np.full(len(truckRows), -float(self.network.truckCapacity))))
+    names = [ f'capacity#{i}#{j}#{t}' for i,j,t in zip(I.tolist(), J.tolist(), T.tolist()) ]
+    self._addMatrixConstrs(rows, cols, coefs, '<', np.zeros(len(I)), names, dropEmpty=True)
+
+  def createDockingConstraintsMatrix(self):
+    N = len(self.nodes)
+    numTicks = self._maxTick - self._minTick + 1
+    travel = self.network.travelTickMatrix
+    loadingTicks = self.network.loadingTicks
+    unloadingTicks = self.network.unloadingTicks
+    I, J, T, col = self._truckTable
+    used = col >= 0
+    I, J, T, col = I[used], J[used], T[used], col[used]
+    rows = []
+    cols = []
+    for eta in range(loadingTicks):
+      departure = T + eta
+      valid = departure + travel[I,J] <= self._maxTick
+      rows.append(I[valid] * numTicks + departure[valid] - self._minTick)
+      cols.append(col[valid])
+    for eta in range(unloadingTicks):
+      arrival = T + travel[I,J] - unloadingTicks + eta
+      valid = (arrival >= self._minTick) & (arrival <= self._maxTick)
+      rows.append(J[valid] * numTicks + arrival[valid] - self._minTick)
+      cols.append(col[valid])
+    coefs = [ np.ones(len(c)) for c in cols ]
+    rhs = np.zeros(N * numTicks)
+    for i in self.nodes:
+      rhs[i*numTicks:(i+1)*numTicks] = self.network.numDocksPerTick(i)
+      if i in self._varExtraDocks:
+        rows.append(i * numTicks + np.arange(numTicks))
+        cols.append(np.full(numTicks, self._varExtraDocks[i].index))
+        coefs.append(np.full(numTicks, -1.0))
+    names = [ f'docking#{i}#{t}' for i in self.nodes for t in self.ticks ]
+    self._addMatrixConstrs(np.concatenate(rows), np.concatenate(cols), np.concatenate(coefs), '<', rhs, names)
+
+  def createFlowBalanceConstraintsMatrix(self, trolleys):
+    N = len(self.nodes)
+    numTicks = self._maxTick - self._minTick + 1
+    travel = self.network.travelTickMatrix
+    commodities, targets, shifts, deadlines = self._commodityArrays()
+    numCommodities = len(commodities)
+    commodityIndex = { k: c for c,k in enumerate(commodities) }
+    def row(i, t, k):
+      return (i * numTicks + t - self._minTick) * numCommodities + k
+
+    rhs = np.zeros(N * numTicks * numCommodities)
+    demand = np.zeros(numCommodities)
+    for (source,releaseTick,target,shift),count in self.trolleyCounts(trolleys).items():
+      rhs[row(source, releaseTick, commodityIndex[target,shift])] += count
+      demand[commodityIndex[target,shift]] += count
+    closed = deadlines <= self._maxTick
+    consumerRows = row(targets, np.minimum(deadlines, self._maxTick), np.arange(numCommodities))
+    np.subtract.at(rhs, consumerRows[closed], demand[closed])
+    if abs(rhs.sum() - demand[~closed].sum()) > 1.0e-6:
+      assert 'Total flow balance of network is nonzero!' == None
+
+    zI, zT, zK, zCol = self._inventoryTable
+    fI, fJ, fT, fK, fCol = self._flowTable
+    inner = zT < self._maxTick
+    rows = [ row(zI, zT, zK), row(zI[inner], zT[inner] + 1, zK[inner]), row(fI, fT, fK), row(fJ, fT + travel[fI,fJ], fK) ]
+    cols = [ zCol, zCol[inner], fCol, fCol ]
+    coefs = [ np.ones(len(zCol)), -np.ones(np.count_nonzero(inner)), np.ones(len(fCol)), -np.ones(len(fCol)) ]
+    for (i,t,target,shift),var in self._varNotProduced.items():
+      rows.append([ row(i, t, commodityIndex[target,shift]) ])
+      cols.append([ var.index ])
+      coefs.append([ 1.0 ])
+    for k,var in self._varNotDelivered.items():
+      if not closed[commodityIndex[k]]:
+        continue
+      rows.append([ consumerRows[commodityIndex[k]] ])
+      cols.append([ var.index ])
+      coefs.append([ -1.0 ])
+    names = [ f'flow_balance#{i}#{t}#{target}#{shift}' for i in self.nodes for t in self.ticks for target,shift in commodities ]
+    self._addMatrixConstrs(np.concatenate(rows), np.concatenate(cols), np.concatenate(coefs), '=', rhs, names, dropEmpty=True)
+
+  def createStorageCapacityConstraintsMatrix(self, isSource):
+    N = len(self.nodes)
+    numTicks = self._maxTick - self._minTick + 1
+    commodities, targets, shifts, deadlines = self._commodityArrays()
+    zI, zT, zK, zCol = self._inventoryTable
+    if isSource:
+      select = targets[zK] != zI
+      rhs = np.array([ self.network.sourceCapacity(i) + self.network.crossCapacity(i) for i in self.nodes ], dtype=float)
+    else:
+      select = targets[zK] == zI
+      rhs = np.array([ self.network.targetCapacity(i) for i in self.nodes ], dtype=float)
+    rows = zI[select] * numTicks + zT[select] - self._minTick
+    self._addMatrixConstrs(rows, zCol[select], np.ones(len(rows)), '<', np.repeat(rhs, numTicks))
 
   def constructInitialSolution(self, trolleys):
 
@@ -299,11 +854,8 @@ class MIP:
     sources = set()
     targets = set()
     duetimes = set()
-    for t in trolleys:
-      releaseTick = network.trolleyReleaseTick(t)
-      source = t.source
-      target = t.commodity[0]
-      depot_inventories[source, releaseTick, target] = depot_inventories.get((source, releaseTick, target), 0) + 1
+    for (source,releaseTick,target,shift),count in self.trolleyCounts(trolleys).items():
+      depot_inventories[source, releaseTick, target] = depot_inventories.get((source, releaseTick, target), 0) + count
       sources.add(source)
       targets.add(target)
 
@@ -344,27 +896,60 @@ class MIP:
     if logfile is None:
       return
 
-    f = open(logfile, 'r')
+    # read the capacities used by the trucks in the previous solution
+    self.constructInitialSolutionFrom(read_solution_file(logfile).truckCounts())
 
+  def constructInitialSolutionFrom(self, trucks, flows=None, complete=False):
+    '''Sets start values from a solution as returned by getSolution, possibly for another discretization.
+    If complete is set, all other trucks, flows and inventories start at zero.'''
     network = self.network
     truck_vars = self.truckvars
-    mintick = self.mintick
-    maxtick = self.maxtick
-    truck_capacity = network.truckCapacity
 
-    # read the capacities used by the trucks in the previous solution
-    for line in f:
-      split = line.split()
-      if split and split[0] == 'C':
-        source, target, time, num = int(split[1]), int(split[2]), float(split[3]), int(split[4])
-        tick = network.timeTick(time)
-        if (source,target,tick) in truck_vars and not isinstance(truck_vars[source,target,tick], float):
-          truck_vars[source,target,tick].start = num
-    f.close()
+    if complete:
+      for variables in [truck_vars, self._varFlow, self._varInventory]:
+        for var in variables.values():
+          if not isinstance(var, float):
+            var.start = 0
+
+    for (source,target,time),num in trucks.items():
+      tick = network.timeTick(time)
+      if (source,target,tick) in truck_vars and not isinstance(truck_vars[source,target,tick], float):
+        truck_vars[source,target,tick].start = num
 
+    if flows is None:
+      return
+    for (source,target,time,commodityTarget,shift),value in flows.items():
+      key = (source,target,network.timeTick(time),commodityTarget,shift)
+      if key in self._varFlow:
+        self._varFlow[key].start = value
+
+  def setTelemetry(self, telemetry):
+    '''Records the phases of building the model and the incumbent and bound while optimizing in telemetry.'''
+    self._telemetry = telemetry
+
+  def phase(self, name):
+    '''Returns a context that records the with block and the model size afterwards as a phase, if enabled.'''
+    if self._telemetry is None:
+      return contextlib.nullcontext()
+    return self._telemetry.phase(name, self.modelSize)
+
+  def modelSize(self):
+    self._model.update()
+    return { 'variables': self._model.NumVars, 'constraints': self._model.NumConstrs, 'nonzeros': self._model.NumNZs }
 
   def optimize(self):
-    self._model.optimize()
+    if (self._solutionWriter is not None or self._telemetry is not None) and self._api is gurobipy:
+      self._model.optimize(self._solutionCallback)
+    else:
+      self._model.optimize()
+    if self._solutionWriter is not None and self._model.SolCount > 0:
+      self._solutionWriter.submit(self._model.objVal, self._values(self._streamVars))
+    if self._telemetry is not None:
+      incumbent = finite(self._model.objVal) if self._model.SolCount > 0 else None
+      bound = finite(self._model.ObjBound) if self._model.SolCount > 0 else None
+      self._telemetry.progress(self._model.Runtime, incumbent, bound, minInterval=0.0)
+      self._telemetry.event('solve', status=self._model.status, runtime=self._model.Runtime, solutions=self._model.SolCount,
+        incumbent=incumbent, bound=bound)
     return self._model.status
 
   def setSollimit(self, limit):
@@ -376,102 +961,240 @@ class MIP:
   def getRuntime(self):
     return self._model.Runtime
 
+  def getSolCount(self):
+    return self._model.SolCount
+
+  def getObjBound(self):
+    return self._model.ObjBound
+
+  def _solutionIndex(self):
+    '''Collects the truck, flow and inventory variables once in lists aligned with arrays of their keys.'''
+    if self._solutionTable is None:
+      truckKeys = [ key for key,var in self._varTruck.items() if not isinstance(var, float) ]
+      position = { key: p for p,key in enumerate(truckKeys) }
+      commodityIndex = { commodity: k for k,commodity in enumerate(self.network.commodities) }
+      flowKeys = list(self._varFlow)
+      self._solutionTable = {
+        'truckKeys': np.array(truckKeys, dtype=int).reshape(-1, 3),
+        'truckVars': [ self._varTruck[key] for key in truckKeys ],
+        'flowKeys': np.array(flowKeys, dtype=int).reshape(-1, 5),
+        'flowVars': list(self._varFlow.values()),
+        'flowTruck': np.array([ position.get(key[:3], -1) for key in flowKeys ], dtype=int),
+        'flowCommodity': np.array([ commodityIndex[key[3:]] for key in flowKeys ], dtype=int),
+        'inventoryKeys': np.array(list(self._varInventory), dtype=int).reshape(-1, 4),
+        'inventoryVars': list(self._varInventory.values()),
+        'notProducedVars': [ var for var in self._varNotProduced.values() if not isinstance(var, float) ],
+        'notDeliveredVars': [ var for var in self._varNotDelivered.values() if not isinstance(var, float) ],
+      }
+    return self._solutionTable
+
+  def _values(self, variables, attribute='X'):
+    '''Returns an attribute of the given variables, fetched in one call, as an array.'''
+    if not variables:
+      return np.zeros(0)
+    return np.asarray(self._model.getAttr(attribute, variables), dtype=float)
+
+  def _usedTrucks(self, truckX=None, flowX=None):
+    '''Returns the positions of the used trucks and of the flows on them, the flow values and the index of
+    the truck of each flow, for the given values or those of the incumbent.'''
+    table = self._solutionIndex()
+    if truckX is None:
+      truckX = self._values(table['truckVars'])
+      flowX = self._values(table['flowVars'])
+    keys = table['truckKeys']
+    trucks = np.flatnonzero(truckX > 0.5)
+    trucks = trucks[np.lexsort((keys[trucks,2], keys[trucks,1], keys[trucks,0]))]
+
+    # The extra last entry maps flows without a truck variable (position -1) to no used truck.
+    rank = np.full(len(truckX) + 1, -1)
+    rank[trucks] = np.arange(len(trucks))
+    flowRank = rank[table['flowTruck']]
+    flows = np.flatnonzero((flowX > 1.0e-4) & (flowRank >= 0))
+    flows = flows[np.lexsort((table['flowCommodity'][flows], flowRank[flows]))]
+    return trucks, flows, flowX[flows], flowRank[flows]
+
   def getSolutionValue(self):
     if self._model.status in [GRB.INFEASIBLE, GRB.INF_OR_UNBD, GRB.UNBOUNDED]:
       return None
 
-    totalDistance = 0.0
-    totalPenalty = 0.0
+    table = self._solutionIndex()
+    truckX = self._values(table['truckVars'])
+    used = np.flatnonzero(truckX > 0.5)
+    totalDistance = sum( (np.round(truckX[used], 0) * self._values([ table['truckVars'][p] for p in used ], 'Obj')).tolist() )
     countNotProduced = 0.0
     countNotDelivered = 0.0
-    for var in self._varTruck.values():
-      if not isinstance(var, float):
-        if var.x > 0.5:
-          totalDistance += round(var.x,0) * var.obj
-    for var in self._varNotProduced.values():
-      if not isinstance(var, float):
-        if var.x > 0.01:
-          countNotProduced += var.x
-          print(f'not produced: {var.x}')
-    for var in self._varNotDelivered.values():
-      if not isinstance(var, float):
-        if var.x > 0.01:
-          countNotDelivered += var.x
-          print(f'not delivered: {var.x}')
+    for x in self._values(table['notProducedVars']).tolist():
+      if x > 0.01:
+        countNotProduced += x
+        print(f'not produced: {x}')
+    for x in self._values(table['notDeliveredVars']).tolist():
+      if x > 0.01:
+        countNotDelivered += x
+        print(f'not delivered: {x}')
     totalPenalty = self._model.objVal - totalDistance
     return self._model.objVal, totalDistance, totalPenalty, countNotProduced, countNotDelivered
 
   def write(self, fileName):
     self._model.write(fileName)
 
+  def getSolution(self):
+    '''Returns the incumbent as (trucks, flows) keyed by time: trucks per (source, target, time) and trolleys
+    per (source, target, time, target, shift).'''
+    if self._model.status in [GRB.INFEASIBLE, GRB.INF_OR_UNBD, GRB.UNBOUNDED] or self._model.SolCount == 0:
+      return None
+
+    table = self._solutionIndex()
+    truckX = self._values(table['truckVars'])
+    flowX = self._values(table['flowVars'])
+    used = np.flatnonzero(flowX > 1.0e-4)
+    flowKeys = table['flowKeys'][used]
+    flowTimes = self.network.tickTime(flowKeys[:,2]).tolist()
+    flows = { (i,j,time,target,shift): x for (i,j,t,target,shift),time,x in zip(flowKeys.tolist(), flowTimes, flowX[used].tolist()) }
+
+    flowTruck = table['flowTruck'][used]
+    usage = np.bincount(flowTruck[flowTruck >= 0], weights=flowX[used][flowTruck >= 0], minlength=len(truckX))
+    usedTrucks = np.flatnonzero(truckX > 0.5)
+    truckKeys = table['truckKeys'][usedTrucks]
+    truckTimes = self.network.tickTime(truckKeys[:,2]).tolist()
+    trucks = { (i,j,time): math.ceil(round(u,2) / self._network.truckCapacity) for (i,j,t),time,u in zip(truckKeys.tolist(), truckTimes, usage[usedTrucks].tolist()) }
+    return trucks, flows
+
+  def getCommittedSolution(self, commitEnd):
+    '''Returns the trucks and flows before commitEnd, the trolleys still in inventory or on the road then,
+    the trolleys not produced and not delivered before it and the extra docks.'''
+    tickTime = self.network.tickTime
+    trucks = {}
+    for (i,j,t),var in self._varTruck.items():
+      if t < commitEnd and not isinstance(var, float) and var.x > 0.5:
+        trucks[i,j,tickTime(t)] = int(round(var.x))
+
+    flows = {}
+    boundary = {}
+    for (i,j,t,target,shift),var in self._varFlow.items():
+      x = var.x
+      if t < commitEnd and x > 1.0e-4:
+        flows[i,j,tickTime(t),target,shift] = x
+        arrival = t + self.network.travelTicks(i,j)
+        if arrival >= commitEnd:
+          boundary[j,arrival,target,shift] = boundary.get((j,arrival,target,shift), 0.0) + x
+    for (i,t,target,shift),var in self._varInventory.items():
+      x = var.x
+      if t == commitEnd - 1 and x > 1.0e-4:
+        boundary[i,commitEnd,target,shift] = boundary.get((i,commitEnd,target,shift), 0.0) + x
+
+    notProduced = sum( var.x for (i,t,target,shift),var in self._varNotProduced.items() if t < commitEnd )
+    notDelivered = sum( var.x for k,var in self._varNotDelivered.items() if self.network.deadlineTick(k) < commitEnd )
+    extraDocks = { i: var.x for i,var in self._varExtraDocks.items() }
+    return trucks, flows, boundary, notProduced, notDelivered, extraDocks
+
   def writeUsedTrucks(self, fileName):
+    '''Writes the incumbent with its inventories; see solutionfile.write_solution_file for the formats.'''
     if fileName is None or self._model.status in [GRB.INFEASIBLE, GRB.INF_OR_UNBD, GRB.UNBOUNDED]:
       return False
 
-    f = open(fileName, 'w')
     vals = self.getSolutionValue()
     assert vals
-    f.write(f'OBJ {vals[0]}\n')
-    f.write(f'DIST {vals[1]}\n')
-    f.write(f'PEN {vals[2]}\n')
-    f.write(f'NPRO {vals[3]}\n')
-    f.write(f'NDEL {vals[4]}\n')
-    f.write('\n')
 
-    for k in self._varInventory.keys():
-      f.write(f'I {k} {self._varInventory[k].X}\n')
+    table = self._solutionIndex()
+    inventories = np.zeros(len(table['inventoryVars']), dtype=INVENTORY_DTYPE)
+    for c,field in enumerate(['node', 'tick', 'destination', 'shift']):
+      inventories[field] = table['inventoryKeys'][:,c]
+    inventories['count'] = self._values(table['inventoryVars'])
 
-    for (i,j) in self.arcs:
-      for t in self.ticks:
-        if t + self.network.travelTicks(i,j) <= max(self.ticks):
-          if (i,j,t) in self._varTruck and not isinstance(self._varTruck[i,j,t], float) and self._varTruck[i,j,t].x > 0.5:
-            f.write(f'T {i} {j} {self.network.tickTime(t)}\n')
-
-    f.write('\n')
-
-    for (i,j) in self.arcs:
-      for t in self.ticks:
-        if t + self.network.travelTicks(i,j) <= max(self.ticks):
-          if (i,j,t) in self._varTruck and not isinstance(self._varTruck[i,j,t], float) and self._varTruck[i,j,t].x > 0.5:
-            usage = 0.0
-            for target,shift in self.network.commodities:
-              if (i,j,t,target,shift) in self._varFlow and self._varFlow[i,j,t,target,shift].x > 1.0e-4:
-                usage += self._varFlow[i,j,t,target,shift].x
-                f.write(f'S {i} {j} {target} {shift} {self.network.tickTime(t)} {math.ceil(round(self._varFlow[i,j,t,target,shift].x,2))}\n')
-            f.write(f'C {i} {j} {self.network.tickTime(t)} {math.ceil(round(usage,2) / self._network.truckCapacity)}\n')
-    f.close()
+    trucks, shipments = self._solutionRecords()
+    write_solution_file(fileName, vals, trucks, shipments, inventories)
     return True
 
+  def _solutionRecords(self, truckX=None, flowX=None):
+    '''Returns the truck and shipment records (see solutionfile) for the values of the truck and flow variables.'''
+    table = self._solutionIndex()
+    used, flows, flowX, flowRank = self._usedTrucks(truckX, flowX)
+    truckKeys = table['truckKeys'][used]
+    flowKeys = table['flowKeys'][flows]
+    usage = np.bincount(flowRank, weights=flowX, minlength=len(used))
+
+    trucks = np.zeros(len(used), dtype=TRUCK_DTYPE)
+    trucks['source'] = truckKeys[:,0]
+    trucks['target'] = truckKeys[:,1]
+    trucks['time'] = self.network.tickTime(truckKeys[:,2])
+    trucks['count'] = [ math.ceil(round(u,2) / self._network.truckCapacity) for u in usage.tolist() ]
+    shipments = np.zeros(len(flows), dtype=SHIPMENT_DTYPE)
+    shipments['source'] = flowKeys[:,0]
+    shipments['target'] = flowKeys[:,1]
+    shipments['destination'] = flowKeys[:,3]
+    shipments['shift'] = flowKeys[:,4]
+    shipments['time'] = self.network.tickTime(flowKeys[:,2])
+    shipments['count'] = flowX
+    return trucks, shipments
+
+  def streamSolutions(self, fileName):
+    '''Writes every new incumbent to fileName while optimizing, or after each optimize with HiGHS;
+    None stops streaming.'''
+    if self._solutionWriter is not None:
+      self._solutionWriter.close()
+      self._solutionWriter = None
+    if fileName is None:
+      return
+    table = self._solutionIndex()
+    self._streamVars = table['truckVars'] + table['flowVars'] + table['notProducedVars'] + table['notDeliveredVars']
+    truckObj = self._values(table['truckVars'], 'Obj')
+
+    def toRecords(objective, values):
+      values = np.asarray(values, dtype=float)
+      numTrucks = len(table['truckVars'])
+      numFlows = len(table['flowVars'])
+      truckX = values[:numTrucks]
+      flowX = values[numTrucks:numTrucks + numFlows]
+      notProduced = values[numTrucks + numFlows:numTrucks + numFlows + len(table['notProducedVars'])]
+      notDelivered = values[numTrucks + numFlows + len(table['notProducedVars']):]
+      used = truckX > 0.5
+      distance = float(np.sum(np.round(truckX[used]) * truckObj[used]))
+      vals = (objective, distance, objective - distance, float(np.sum(notProduced[notProduced > 0.01])), float(np.sum(notDelivered[notDelivered > 0.01])))
+      return (vals,) + self._solutionRecords(truckX, flowX)
+
+    self._solutionWriter = SolutionWriter(fileName, toRecords)
+
+  def _solutionCallback(self, model, where):
+    if where == GRB.Callback.MIPSOL:
+      if self._solutionWriter is not None:
+        self._solutionWriter.submit(model.cbGet(GRB.Callback.MIPSOL_OBJ), model.cbGetSolution(self._streamVars))
+      if self._telemetry is not None:
+        self._telemetry.progress(model.cbGet(GRB.Callback.RUNTIME), model.cbGet(GRB.Callback.MIPSOL_OBJ),
+          model.cbGet(GRB.Callback.MIPSOL_OBJBND), minInterval=0.0)
+    elif where == GRB.Callback.MIP and self._telemetry is not None:
+      self._telemetry.progress(model.cbGet(GRB.Callback.RUNTIME), model.cbGet(GRB.Callback.MIP_OBJBST),
+        model.cbGet(GRB.Callback.MIP_OBJBND))
+
   def printSolution(self):
-    loadingTicks = self.network.loadingTicks
-    unloadingTicks = self.network.unloadingTicks
-    totalDrivingDistance = 0.0
+    network = self.network
+    table = self._solutionIndex()
+    used, flows, flowX, flowRank = self._usedTrucks()
+    truckX = self._values(table['truckVars'])
+    truckObj = self._values([ table['truckVars'][p] for p in used ], 'Obj')
+    totalDrivingDistance = sum( (truckX[used] * truckObj).tolist() )
+
+    truckFlows = {}
+    for (i,j,t,target,shift),x in zip(table['flowKeys'][flows].tolist(), flowX.tolist()):
+      truckFlows.setdefault((i,j,t), []).append((target, shift, x))
+    for i,j,t in table['truckKeys'][used].tolist():
+      carried = truckFlows.get((i,j,t), [])
+      print(f'Truck from {i}<{network.name(i)}> to {j}<{network.name(j)}> at tick {t} -> {t + network.travelTicks(i,j)}, carrying {round(sum(( x for target,shift,x in carried ), 0.0),2)} trolleys.')
+      for target,shift,x in carried:
+        print(f'  It carries {round(x,2)} trolleys of commodity {target}<{network.name(target)}>,{shift} from {i}<{network.name(i)}> to {j}<{network.name(j)}> at tick {t} -> {t + network.travelTicks(i,j)}.')
+
     totalUndelivered = 0
     totalNotproduced = 0
-
-    for (i,j) in self.arcs:
-      for t in self.ticks:
-        if t + self.network.travelTicks(i,j) <= max(self.ticks):
-          if self._varTruck[i,j,t].x > 0.5:
-            totalDrivingDistance += self._varTruck[i,j,t].x * self._varTruck[i,j,t].obj
-            usage = 0.0
-            for target,shift in self.network.commodities:
-              if (i,j,t,target,shift) in self._varFlow and self._varFlow[i,j,t,target,shift].x > 1.0e-4:
-                usage += self._varFlow[i,j,t,target,shift].x
-            print(f'Truck from {i}<{self.network.name(i)}> to {j}<{self.network.name(j)}> at tick {t} -> {t + self.network.travelTicks(i,j)}, carrying {round(usage,2)} trolleys.')
-
-            for target,shift in self.network.commodities:
-              if (i,j,t,target,shift) in self._varFlow and self._varFlow[i,j,t,target,shift].x > 1.0e-4:
-                print(f'  It carries {round(self._varFlow[i,j,t,target,shift].x,2)} trolleys of commodity {target}<{self.network.name(target)}>,{shift} from {i}<{self.network.name(i)}> to {j}<{self.network.name(j)}> at tick {t} -> {t + self.network.travelTicks(i,j)}.')
-    for target,shift in self.network.commodities:
-      if (target,shift) in self._varNotDelivered and self._varNotDelivered[target,shift].x > 0.5:
-        print(f'Commodity {target}<{self.network.name(target)}>,{shift} has {round(self._varNotDelivered[target,shift].x,0)} undelivered trolleys.')
-        totalUndelivered += round(self._varNotDelivered[target,shift].x,0)
+    notDelivered = dict(zip(self._varNotDelivered, self._values(list(self._varNotDelivered.values())).tolist()))
+    notProduced = dict(zip(self._varNotProduced, self._values(list(self._varNotProduced.values())).tolist()))
+    for target,shift in network.commodities:
+      if notDelivered.get((target,shift), 0.0) > 0.5:
+        print(f'Commodity {target}<{network.name(target)}>,{shift} has {round(notDelivered[target,shift],0)} undelivered trolleys.')
+        totalUndelivered += round(notDelivered[target,shift],0)
       for i in self.nodes:
         for t in self.ticks:
-          if (i,t,target,shift) in self._varNotProduced and self._varNotProduced[i,t,target,shift].x > 0.5:
-            print(f'Commodity {target}<{self.network.name(target)}>,{shift} has {round(self._varNotProduced[i,t,target,shift].x,0)} trolleys not produced in {i}<{self.network.name(i)}> at tick {t} (deadline {self.network.deadlineTick((target,shift))}).')
-            totalNotproduced += round(self._varNotProduced[i,t,target,shift].x,0)
+          if notProduced.get((i,t,target,shift), 0.0) > 0.5:
+            print(f'Commodity {target}<{network.name(target)}>,{shift} has {round(notProduced[i,t,target,shift],0)} trolleys not produced in {i}<{network.name(i)}> at tick {t} (deadline {network.deadlineTick((target,shift))}).')
+            totalNotproduced += round(notProduced[i,t,target,shift],0)
     print(f'Total driving distance is {totalDrivingDistance}.')
     print(f'Total number of undelivered trolleys is {totalUndelivered}.')
     print(f'Total number of not produced trolleys is {totalNotproduced}.')
@@ -515,45 +1238,92 @@ class MIP:
 #status = mip.optimize()
 #mip.printSolution()
 
-def run_experiments(network, trolleys, tickHours, tickZero, modifyTrolleysDeliverable, writeTrucksFileName, readTrucksFileName, allowedTruckDeviation, constructInitial, timeLimit, solutionLimit, solutionTimeLimit):
+def build_model(network, trolleys, modifyTrolleysDeliverable, readTrucksFileName, allowedTruckDeviation, vectorized=False, prune=False, solver='gurobi', threads=4, previousSolution=None, incremental=False, workers=None, relaxCapacity=False, telemetry=None):
+  '''Creates the MIP for the current discretization; relaxCapacity omits the truck capacity constraints.'''
 
-  print(f'Read instance with {len(network.locations)} locations and {len(trolleys)} trolleys.')
+  mip = MIP(network, readTrucksFileName, allowedTruckDeviation, vectorized, solver, threads, incremental, workers)
+  mip.setTelemetry(telemetry)
+  if previousSolution is not None:
+    mip.setAllowedTrucks(previousSolution[0])
 
-  network.setDiscretization(tickHours, tickZero)
+  with mip.phase('prepareTrolleys'):
+    trolleyCounts = mip.prepareTrolleys(trolleys, modifyTrolleysDeliverable)
+  with mip.phase('setTimeHorizon'):
+    mip.setTimeHorizon(trolleyCounts)
+  print(f'Ticks are in range [{min(mip.ticks)},{max(mip.ticks)}].')
 
-  requiredTrolleys = [ t for t in trolleys if t.source != t.commodity[0] ]
-  print(f'Removed {len(trolleys) - len(requiredTrolleys)} trolleys having equal origin and destination.')
+  if prune:
+    with mip.phase('computeReachability'):
+      mip.computeReachability(trolleyCounts)
 
-  mip = MIP(network, readTrucksFileName, allowedTruckDeviation)
+  mip.createModel(trolleyCounts, relaxCapacity)
+  return mip
 
-  if modifyTrolleysDeliverable:
-    trolleys,numModifications = mip.makeTrolleysDeliverable(requiredTrolleys)
-    print(f'Modified {numModifications} trolley release times to make them deliverable.')
-  else:
-    trolleys = mip.filterDeliverableTrolleys(requiredTrolleys)
-    print(f'Kept {len(trolleys)} of {len(requiredTrolleys)} deliverable trolleys.')
+def run_experiments(network, trolleys, tickHours, tickZero, modifyTrolleysDeliverable, writeTrucksFileName, readTrucksFileName, allowedTruckDeviation, constructInitial, timeLimit, solutionLimit, solutionTimeLimit, vectorized=False, prune=False, solver='gurobi', threads=4, previousSolution=None, returnSolution=False, modelCache=None, workers=None, greedyStart=False, localSearchTime=0, streamFileName=None, telemetryFileName=None):
+  '''Builds and solves the MIP for the discretization; previousSolution replaces readTrucksFileName, and modelCache
+  keeps models per discretization. Returns vals, or (vals, solution) with returnSolution.'''
 
-  mip.setTimeHorizon(trolleys)
-  print(f'Ticks are in range [{min(mip.ticks)},{max(mip.ticks)}].')
+  print(f'Read instance with {len(network.locations)} locations and {len(trolleys)} trolleys.')
 
-  mip.createTruckVars(forFree=False)
-  mip.createFlowVars()
-  mip.createInventoryVars()
-  mip.createExtraDocksVars()
-  mip.createNotDeliveredVars()
-  mip.createNotProducedVars(trolleys)
-  mip.createExtendedCapacityVars()
-  mip.createCapacityConstraints()
-  mip.createSourceCapacityConstraints()
-  mip.createTargetCapacityConstraints()
-  mip.createFlowBalanceConstraints(trolleys)
-  mip.createDockingConstraints()
-
-  if constructInitial:
-     mip.constructInitialSolutionLog(readTrucksFileName)
+  telemetry = Telemetry(telemetryFileName, tickHours=tickHours, tickZero=tickZero, solver=solver) if telemetryFileName is not None else None
+  def phase(name):
+    return telemetry.phase(name) if telemetry is not None else contextlib.nullcontext()
+
+  with phase('setDiscretization'):
+    network.setDiscretization(tickHours, tickZero)
+
+  if modelCache is not None and (tickHours, tickZero) in modelCache:
+    print('Reusing the model of an earlier run with the same discretization.')
+    mip = modelCache[tickHours, tickZero]
+    mip.setTelemetry(telemetry)
+    with phase('applyAllowedTrucks'):
+      if previousSolution is not None:
+        mip.setAllowedTrucks(previousSolution[0])
+      else:
+        mip.readAllowedTrucks(readTrucksFileName)
+      mip.applyAllowedTrucks(allowedTruckDeviation)
+  else:
+    with phase('build_model'):
+      mip = build_model(network, trolleys, modifyTrolleysDeliverable, readTrucksFileName, allowedTruckDeviation,
+        vectorized, prune, solver, threads, previousSolution, incremental=modelCache is not None, workers=workers,
+        telemetry=telemetry)
+    if modelCache is not None:
+      modelCache[tickHours, tickZero] = mip
+
+  if greedyStart:
+    from heuristic import construct_greedy
+    with phase('construct_greedy'):
+      greedyVals, greedySolution = construct_greedy(mip)
+    print(f'Constructed a greedy solution with value {greedyVals[0]:.2f}.')
+    if localSearchTime > 0:
+      from localsearch import improve_solution
+      with phase('improve_solution'):
+        greedyVals, greedySolution = improve_solution(mip, greedyVals, greedySolution, localSearchTime)
+    with phase('constructInitialSolution'):
+      mip.constructInitialSolutionFrom(*greedySolution, complete=True)
+  elif constructInitial:
+    with phase('constructInitialSolution'):
+      if previousSolution is not None:
+        mip.constructInitialSolutionFrom(*previousSolution)
+      else:
+        mip.constructInitialSolutionLog(readTrucksFileName)
+
+  def finish():
+    vals = mip.getSolutionValue()
+    with phase('writeUsedTrucks'):
+      mip.writeUsedTrucks(writeTrucksFileName)
+    if telemetry is not None:
+      # Without a solution, the result event still marks the end of the run, with null values.
+      telemetry.event('result', **dict(zip(VALUE_NAMES, vals if vals is not None else [None] * len(VALUE_NAMES))))
+      mip.setTelemetry(None)
+      telemetry.close()
+    if returnSolution:
+      return vals, mip.getSolution()
+    return vals
 
   status = None
   currentTime = 0.0
+  mip.streamSolutions(streamFileName)
 
   # if we use a solution limit together with a time limit
   if not solutionLimit is None:
@@ -563,13 +1333,11 @@ def run_experiments(network, trolleys, tickHours, tickZero, modifyTrolleysDelive
     mip.setSollimit(1000)
     mip.setTimelimit(min(solutionTimeLimit, max(0, timeLimit - mip.getRuntime())))
     status = mip.optimize()
-
-    vals = mip.getSolutionValue()
-    mip.writeUsedTrucks(writeTrucksFileName)
-    return vals
+    mip.streamSolutions(None)
+    return finish()
 
   # Run the code to produce one solution in case we do not read an initial solution
-  if readTrucksFileName is None:
+  if readTrucksFileName is None and previousSolution is None and not greedyStart:
     mip.setSollimit(1)
     mip.optimize()
     currentTime = mip.getRuntime()
@@ -578,10 +1346,103 @@ def run_experiments(network, trolleys, tickHours, tickZero, modifyTrolleysDelive
   mip.setSollimit(1000)
   mip.setTimelimit(currentTime + timeLimit)
   mip.optimize()
+  mip.streamSolutions(None)
+  return finish()
+
+def write_solution(fileName, vals, solution, truckCapacity):
+  '''Writes a solution (trucks, flows) keyed by time as MIP.writeUsedTrucks does, without inventories.'''
+  trucks, flows = solution
+  truckFlows = {}
+  for (i,j,time,target,shift),x in flows.items():
+    truckFlows.setdefault((i,j,time), []).append((target,shift,x))
+
+  truckRecords = []
+  shipments = []
+  for (i,j,time) in sorted(trucks):
+    usage = 0.0
+    for target,shift,x in truckFlows.get((i,j,time), []):
+      usage += x
+      shipments.append((i, j, target, shift, time, x))
+    truckRecords.append((i, j, time, math.ceil(round(usage,2) / truckCapacity)))
+  write_solution_file(fileName, vals, records(truckRecords, TRUCK_DTYPE), records(shipments, SHIPMENT_DTYPE))
+
+def read_solution(fileName):
+  '''Reads a solution file and returns the values and the solution (trucks, flows) as getSolution does.'''
+  solution = read_solution_file(fileName)
+  return solution.values, (solution.truckCounts(), solution.flows())
+
+def run_rolling_horizon(network, trolleys, tickHours, tickZero, modifyTrolleysDeliverable, writeTrucksFileName, windowHours, commitHours, timeLimit, vectorized=False, solver='gurobi', threads=4):
+  '''Solves consecutive windows of windowHours hours, fixing what departs before the next window starts
+  commitHours later. Returns the values and the solution (trucks, flows) of the combined solution.'''
+
+  print(f'Read instance with {len(network.locations)} locations and {len(trolleys)} trolleys.')
 
-  vals = mip.getSolutionValue()
-  mip.writeUsedTrucks(writeTrucksFileName)
-  return vals
+  network.setDiscretization(tickHours, tickZero)
+  windowTicks = max(1, int(round(windowHours / tickHours)))
+  commitTicks = max(1, min(windowTicks, int(round(commitHours / tickHours))))
+
+  # Only trucks that arrive within the window exist, so every truck departing in the committed part must fit.
+  minWindowTicks = commitTicks + int(network.travelTickMatrix.max())
+  if windowTicks < minWindowTicks:
+    print(f'Extending windows from {windowTicks} to {minWindowTicks} ticks such that all trucks departing in the committed part arrive within the window.')
+    windowTicks = minWindowTicks
+
+  # Filtering the trolleys and the full range of ticks do not depend on the window.
+  planner = MIP(network, None, 1e4, vectorized, solver, threads)
+  trolleyCounts = planner.prepareTrolleys(trolleys, modifyTrolleysDeliverable)
+  planner.setTimeHorizon(trolleyCounts)
+  firstTick, lastTick = planner.mintick, planner.maxtick
+  print(f'Ticks are in range [{firstTick},{lastTick}], solving windows of {windowTicks} ticks that advance by {commitTicks} ticks.')
+
+  trucks = {}
+  flows = {}
+  boundary = {}
+  totalDistance = 0.0
+  totalNotProduced = 0.0
+  totalNotDelivered = 0.0
+  extraDocks = {}
+  start = firstTick
+  while True:
+    end = min(start + windowTicks - 1, lastTick)
+    commitEnd = end + 1 if end == lastTick else start + commitTicks
+    windowCounts = { key: count for key,count in trolleyCounts.items() if start <= key[1] <= end }
+    for key,count in boundary.items():
+      if key[1] <= end:
+        windowCounts[key] = windowCounts.get(key, 0) + count
+    print(f'Solving window [{start},{end}] with {sum(windowCounts.values()):.0f} trolleys, committing ticks before {commitEnd}.')
+
+    mip = MIP(network, None, 1e4, vectorized, solver, threads)
+    mip.setTimeHorizon(windowCounts, window=(start, end))
+    mip.createModel(windowCounts)
+    mip.setTimelimit(timeLimit)
+    mip.optimize()
+    if mip.getSolCount() == 0:
+      print(f'No solution found for window [{start},{end}].')
+      return None, None
+
+    windowTrucks, windowFlows, windowBoundary, notProduced, notDelivered, windowExtraDocks = mip.getCommittedSolution(commitEnd)
+    trucks.update(windowTrucks)
+    flows.update(windowFlows)
+    totalDistance += sum( count * network.distance(i,j) for (i,j,time),count in windowTrucks.items() )
+    totalNotProduced += notProduced
+    totalNotDelivered += notDelivered
+    for i,docks in windowExtraDocks.items():
+      extraDocks[i] = max(extraDocks.get(i, 0.0), docks)
+
+    # Trolleys arriving after this window are still on the road at the start of the next one.
+    boundary = { key: count for key,count in boundary.items() if key[1] > end }
+    for key,count in windowBoundary.items():
+      boundary[key] = boundary.get(key, 0.0) + count
+
+    if end == lastTick:
+      break
+    start = commitEnd
+
+  totalPenalty = mip.undeliveredPenalty * (totalNotProduced + totalNotDelivered) + mip.extraDockPenalty * sum(extraDocks.values())
+  vals = (totalDistance + totalPenalty, totalDistance, totalPenalty, totalNotProduced, totalNotDelivered)
+  if writeTrucksFileName is not None:
+    write_solution(writeTrucksFileName, vals, (trucks, flows), network.truckCapacity)
+  return vals, (trucks, flows)
 
 if __name__ == "__main__":
 
@@ -599,6 +1460,15 @@ if __name__ == "__main__":
   modifyTrolleysDeliverable = False
   timeLimit = 86400
   constructInitial = False
+  vectorized = False
+  prune = False
+  solver = 'gurobi'
+  workers = None
+  rollingHorizon = None
+  greedyStart = False
+  localSearchTime = 0
+  streamFileName = None
+  telemetryFileName = None
   a = 5
   while a < len(sys.argv):
     arg = sys.argv[a]
@@ -618,14 +1488,43 @@ if __name__ == "__main__":
       modifyTrolleysDeliverable = True
     elif arg == '-c':
       constructInitial = True
+    elif arg == '-v':
+      vectorized = True
+    elif arg == '-p':
+      prune = True
+    elif arg == '-s' and a+1 < len(sys.argv):
+      solver = sys.argv[a+1]
+      a += 1
+    elif arg == '-w' and a+1 < len(sys.argv):
+      workers = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-g':
+      greedyStart = True
+    elif arg == '-f' and a+1 < len(sys.argv):
+      streamFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-e' and a+1 < len(sys.argv):
+      telemetryFileName = sys.argv[a+1]
+      a += 1
+    elif arg == '-l' and a+1 < len(sys.argv):
+      localSearchTime = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-r' and a+2 < len(sys.argv):
+      rollingHorizon = (float(sys.argv[a+1]), float(sys.argv[a+2]))
+      a += 2
     else:
       printUsage(f'Unprocessed argument <{arg}>.')
     a += 1
 
-  vals = run_experiments(network=network, trolleys=trolleys, tickHours=tickHours, tickZero=tickZero,
-    modifyTrolleysDeliverable=modifyTrolleysDeliverable, writeTrucksFileName=writeTrucksFileName,
-    readTrucksFileName=readTrucksFileName, allowedTruckDeviation=allowedTruckDeviation, constructInitial=constructInitial,
-    timeLimit=timeLimit, solutionLimit=None, solutionTimeLimit=60)
+  if rollingHorizon is not None:
+    vals, solution = run_rolling_horizon(network, trolleys, tickHours, tickZero, modifyTrolleysDeliverable,
+      writeTrucksFileName, rollingHorizon[0], rollingHorizon[1], timeLimit, vectorized, solver)
+  else:
+    vals = run_experiments(network=network, trolleys=trolleys, tickHours=tickHours, tickZero=tickZero,
+      modifyTrolleysDeliverable=modifyTrolleysDeliverable, writeTrucksFileName=writeTrucksFileName,
+      readTrucksFileName=readTrucksFileName, allowedTruckDeviation=allowedTruckDeviation, constructInitial=constructInitial,
+      timeLimit=timeLimit, solutionLimit=None, solutionTimeLimit=60, vectorized=vectorized, prune=prune, solver=solver, workers=workers, greedyStart=greedyStart, localSearchTime=localSearchTime, streamFileName=streamFileName,
+      telemetryFileName=telemetryFileName)
 
   if vals is None:
     print(f'No solution found.')
@@ -3,6 +3,8 @@ import csv
 
 class LocationData:
 
+  __slots__ = ('name', 'x', 'y', 'originCapacity', 'destinationCapacity', 'crossCapacity', 'numDocks', 'distances')
+
   def __init__(self, name, x, y, originCapacity, destinationCapacity, crossCapacity, numDocks):
     self.name = name
     self.x = x
@@ -15,6 +17,8 @@ class LocationData:
 
 class Trolley:
 
+  __slots__ = ('source', 'release', 'commodity')
+
   def __init__(self, source, release, commodity):
     self.source = source
     self.release = release
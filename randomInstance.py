@@ -1,18 +1,120 @@
+import sys
+import math
+import numpy as np
 from common import *
 
-instance = Instance(sys.argv[1])
-demandinstance = Demandinstance(instance)
+# Random instances resemble the public example: depots lie in a disc of 2 hours radius and cross-docks on a circle of
+# half that radius, distances are Euclidean, and each depot releases trolleys uniformly within a window of releaseHours
+# hours for all depots (including itself) and all shifts. The storage capacities scale with the volume of the depot as
+# in the public example (400 and 800 for 2000 trolleys), and each cross-dock can hold twice the total volume split
+# among all cross-docks. Everything depends only on the arguments, such that a seed always gives the same files.
 
-print(demandinstance)
+def printUsage(errorMessage=None):
+  if errorMessage is not None:
+    print(f'Error: {errorMessage}')
+  print(f'Usage: {sys.argv[0]} <network file name> <trolleys file name> [OPTIONS...]')
+  print('Creates a random network and trolleys file in the formats that Network reads.')
+  print('Options:')
+  print('  -n NUM     Create NUM depots (default: 10).')
+  print('  -x NUM     Create NUM cross-docks (default: 4).')
+  print('  -k NUM     Create NUM shifts per depot (default: 8).')
+  print('  -t NUM     Create NUM trolleys per depot on average (default: 2000).')
+  print('  -u SPREAD  Vary the number of trolleys per depot by up to a factor of 1 +/- SPREAD (default: 0).')
+  print('  -r SEED    Use SEED for the random numbers (default: 0).')
+  sys.exit(1)
 
-randinstance = createRandomInstance(demandinstance)
+def create_random_instance(numDepots, numCrossDocks, numShifts, trolleysPerDepot, seed=0, volumeSpread=0.0,
+  radius=2.0, releaseStart=20.0, releaseHours=5.0, firstDeadline=29.0, shiftHours=0.625):
+  '''Returns a random network and its trolleys as a TrolleySet.'''
+  rng = np.random.default_rng(seed)
+  volumes = np.round(trolleysPerDepot * (1.0 + volumeSpread * rng.uniform(-1.0, 1.0, numDepots))).astype(int)
+  angles = rng.uniform(0.0, 2.0 * math.pi, numDepots)
+  distances = radius * np.sqrt(rng.uniform(0.0, 1.0, numDepots))
+  x = np.concatenate((distances * np.cos(angles), radius / 2 * np.cos(2.0 * math.pi * np.arange(numCrossDocks) / max(1, numCrossDocks))))
+  y = np.concatenate((distances * np.sin(angles), radius / 2 * np.sin(2.0 * math.pi * np.arange(numCrossDocks) / max(1, numCrossDocks))))
 
-randdemandinstance = Demandinstance(randinstance)
+  network = Network()
+  network.setTruckCapacity(48)
+  network.setUnloadingTime(0.15)
+  network.setLoadingTime(0.10)
+  for i in range(numDepots):
+    network.addLocation(LocationData(f'Depot_{i}', float(x[i]), float(y[i]), int(math.ceil(0.2 * volumes[i])), int(math.ceil(0.4 * volumes[i])), 0, 10))
+  crossCapacity = int(math.ceil(2 * volumes.sum() / max(1, numCrossDocks)))
+  for c in range(numCrossDocks):
+    network.addLocation(LocationData(f'Cross_{c}', float(x[numDepots + c]), float(y[numDepots + c]), 0, 0, crossCapacity, 20))
 
-print(randdemandinstance)
+  # Distances are rounded as in the network file, such that the network equals the one read from the file.
+  arcs = np.round(np.hypot(x[:,None] - x[None,:], y[:,None] - y[None,:]), 3)
+  for s in network.locations:
+    for t in network.locations:
+      network.addArc(s, t, float(arcs[s,t]))
 
+  offsets = rng.uniform(0.0, 1.0, numDepots)
+  for i in range(numDepots):
+    for shift in range(1, numShifts + 1):
+      network.addCommodity(i, shift, round(firstDeadline + offsets[i] + shiftHours * (shift - 1), 2))
 
-# randinstance.writeinstance('random1.instance')
+  sources = np.repeat(np.arange(numDepots), volumes)
+  targets = rng.integers(0, numDepots, len(sources))
+  shifts = rng.integers(1, numShifts + 1, len(sources))
+  releases = np.round(rng.uniform(releaseStart, releaseStart + releaseHours, len(sources)), 2)
+  order = np.argsort(releases, kind='stable')
+  return network, TrolleySet(sources[order], targets[order], shifts[order], releases[order])
 
-# for i in randinstance.trolleys:
-#     print(f'{randinstance.trolleys[i].release} {randinstance.trolleys[i].deadline}')
+def write_trolleys(fileName, network, trolleys):
+  '''Writes the trolleys in the format of the public example, which Network.readTrolleys reads.'''
+  names = [ network.name(p) for p in network.locations ]
+  f = open(fileName, 'w')
+  f.write('From; To; Shift; Time \n')
+  f.writelines(f'{names[source]};{names[target]};{shift};{release:.2f}\n' for source,target,shift,release in
+    zip(trolleys.sources.tolist(), trolleys.targets.tolist(), trolleys.shifts.tolist(), trolleys.releases.tolist()))
+  f.close()
+
+def write_random_instance(networkFileName, trolleysFileName, *args, **kwargs):
+  '''Creates a random instance with create_random_instance and writes the network and trolleys files.'''
+  network, trolleys = create_random_instance(*args, **kwargs)
+  f = open(networkFileName, 'w')
+  network.write(f)
+  f.close()
+  write_trolleys(trolleysFileName, network, trolleys)
+  return network, trolleys
+
+if __name__ == "__main__":
+
+  if len(sys.argv) < 3:
+    printUsage('Requires 2 arguments.')
+
+  numDepots = 10
+  numCrossDocks = 4
+  numShifts = 8
+  trolleysPerDepot = 2000
+  volumeSpread = 0.0
+  seed = 0
+  a = 3
+  while a < len(sys.argv):
+    arg = sys.argv[a]
+    if arg == '-n' and a+1 < len(sys.argv):
+      numDepots = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-x' and a+1 < len(sys.argv):
+      numCrossDocks = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-k' and a+1 < len(sys.argv):
+      numShifts = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-t' and a+1 < len(sys.argv):
+      trolleysPerDepot = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-u' and a+1 < len(sys.argv):
+      volumeSpread = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-r' and a+1 < len(sys.argv):
+      seed = int(sys.argv[a+1])
+      a += 1
+    else:
+      printUsage(f'Unprocessed argument <{arg}>.')
+    a += 1
+
+  network, trolleys = write_random_instance(sys.argv[1], sys.argv[2], numDepots, numCrossDocks, numShifts,
+    trolleysPerDepot, seed, volumeSpread)
+  print(f'Created {numDepots} depots, {numCrossDocks} cross-docks, {len(network.commodities)} commodities and {len(trolleys)} trolleys.')
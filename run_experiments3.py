@@ -8,24 +8,34 @@ network = Network(sys.argv[1])
 trolleys = network.readTrolleys(sys.argv[2])
 prefix = sys.argv[3]
 
+# The solution of each run is handed to the next one in memory; the files only serve as a record. The latest incumbent
+# of the running solve is always in the incumbent file, such that a killed run loses at most the solution in progress.
+streamFileName = f'{prefix}.incumbent.npz'
+
+# All runs append their phase timings and solver trajectories to one telemetry file, tagged with the discretization.
+telemetryFileName = f'{prefix}.telemetry.jsonl'
+
 # 120min discretization
 
 count120 = 0
-lastFileName = None
+lastSolution = None
 bestVals = None
 bestValsFileName = None
 while True:
   count120 += 1
-  outputFileName = f'{prefix}.120-{count120}.sol'
+  outputFileName = f'{prefix}.120-{count120}.npz'
   if exists(outputFileName):
     print(f'Output file <{outputFileName}> exists!')
     sys.exit(1)
 
-  vals = run_experiments(network=network, trolleys=trolleys, tickHours=2.0, tickZero=0.0,
+  vals, solution = run_experiments(network=network, trolleys=trolleys, tickHours=2.0, tickZero=0.0,
     modifyTrolleysDeliverable=False, writeTrucksFileName=outputFileName,
-    readTrucksFileName=lastFileName, allowedTruckDeviation=1, constructInitial=True,
-    timeLimit=300, solutionLimit=None, solutionTimeLimit=60)
+    readTrucksFileName=None, previousSolution=lastSolution, returnSolution=True, allowedTruckDeviation=1, constructInitial=True,
+    timeLimit=300, solutionLimit=None, solutionTimeLimit=60, streamFileName=streamFileName,
+    telemetryFileName=telemetryFileName)
   lastFileName = outputFileName
+  if solution is not None:
+    lastSolution = solution
 
   if vals is None:
     print(f'No solution found.')
@@ -44,16 +54,19 @@ while True:
 count60 = 0
 while True:
   count60 += 1
-  outputFileName = f'{prefix}.60-{count60}.sol'
+  outputFileName = f'{prefix}.60-{count60}.npz'
   if exists(outputFileName):
     print(f'Output file <{outputFileName}> exists!')
     sys.exit(1)
 
-  vals = run_experiments(network=network, trolleys=trolleys, tickHours=1.0, tickZero=0.0,
+  vals, solution = run_experiments(network=network, trolleys=trolleys, tickHours=1.0, tickZero=0.0,
     modifyTrolleysDeliverable=False, writeTrucksFileName=outputFileName,
-    readTrucksFileName=lastFileName, allowedTruckDeviation=1.1, constructInitial=True,
-    timeLimit=1800, solutionLimit=None, solutionTimeLimit=60)
+    readTrucksFileName=None, previousSolution=lastSolution, returnSolution=True, allowedTruckDeviation=1.1, constructInitial=True,
+    timeLimit=1800, solutionLimit=None, solutionTimeLimit=60, streamFileName=streamFileName,
+    telemetryFileName=telemetryFileName)
   lastFileName = outputFileName
+  if solution is not None:
+    lastSolution = solution
 
   if vals is None:
     print(f'No solution found.')
@@ -69,24 +82,29 @@ while True:
 
 # 30min discretization
 
+# All runs have the same discretization, so the model is built once and only the allowed trucks are updated.
+models = {}
 count30 = 0
 solTimeLimit = 300
 remainingTime = 86400
 while remainingTime > 60:
   count30 += 1
-  outputFileName = f'{prefix}.30-{count30}.sol'
+  outputFileName = f'{prefix}.30-{count30}.npz'
   if exists(outputFileName):
     print(f'Output file <{outputFileName}> exists!')
     sys.exit(1)
 
   start = time.time()
-  vals = run_experiments(network=network, trolleys=trolleys, tickHours=0.5, tickZero=0.0,
+  vals, solution = run_experiments(network=network, trolleys=trolleys, tickHours=0.5, tickZero=0.0,
     modifyTrolleysDeliverable=False, writeTrucksFileName=outputFileName,
-    readTrucksFileName=lastFileName, allowedTruckDeviation=0.6, constructInitial=True,
-    timeLimit=remainingTime, solutionLimit=2, solutionTimeLimit=solTimeLimit)
+    readTrucksFileName=None, previousSolution=lastSolution, returnSolution=True, allowedTruckDeviation=0.6, constructInitial=True,
+    timeLimit=remainingTime, solutionLimit=2, solutionTimeLimit=solTimeLimit, modelCache=models, streamFileName=streamFileName,
+    telemetryFileName=telemetryFileName)
   end = time.time()
   remainingTime -= (end - start)
   lastFileName = outputFileName
+  if solution is not None:
+    lastSolution = solution
 
   if vals:
     print(f'Found 30min solution with value {vals[0]} with total distance {vals[1]:.2f} and penalties {vals[2]:.1f}.')
@@ -0,0 +1,174 @@
+import os
+import sys
+import math
+import threading
+import numpy as np
+
+# Solutions are stored either as text (T/S/C/I lines, see MIP.writeUsedTrucks) or, if the file name ends with .npz, as
+# NumPy arrays of typed records in a single uncompressed .npz file. The binary format keeps exact trolley numbers and
+# only the nonzero inventories, and is read without parsing. All readers of solutions go through read_solution_file.
+
+VALUE_NAMES = ['OBJ', 'DIST', 'PEN', 'NPRO', 'NDEL']
+
+# A truck record holds the number of trucks needed for the trolleys that the used truck (arc and time) carries.
+TRUCK_DTYPE = np.dtype([('source', np.int32), ('target', np.int32), ('time', np.float64), ('count', np.int32)])
+
+# A shipment record holds the number of trolleys of the commodity (destination, shift) on the truck.
+SHIPMENT_DTYPE = np.dtype([('source', np.int32), ('target', np.int32), ('destination', np.int32), ('shift', np.int32), ('time', np.float64), ('count', np.float64)])
+
+# An inventory record holds the number of trolleys of the commodity (destination, shift) at the node after the tick.
+INVENTORY_DTYPE = np.dtype([('node', np.int32), ('tick', np.int32), ('destination', np.int32), ('shift', np.int32), ('count', np.float64)])
+
+class SolutionFile:
+  '''The values (objective, distance, penalty, not produced, not delivered) and the records of a solution.'''
+
+  def __init__(self, values, trucks, shipments, inventories):
+    self.values = tuple(values)
+    self.trucks = trucks
+    self.shipments = shipments
+    self.inventories = inventories
+
+  def truckCounts(self):
+    '''Returns the numbers of trucks per (source, target, time).'''
+    return { (int(source),int(target),float(time)): int(count) for source,target,time,count in self.trucks.tolist() }
+
+  def flows(self):
+    '''Returns the numbers of trolleys per (source, target, time, destination, shift) as MIP.getSolution does.'''
+    flows = {}
+    for source,target,destination,shift,time,count in self.shipments.tolist():
+      key = (source,target,time,destination,shift)
+      flows[key] = flows.get(key, 0.0) + count
+    return flows
+
+def records(values, dtype):
+  '''Turns a list of tuples into an array of records of the given type.'''
+  return np.array(values, dtype=dtype) if len(values) > 0 else np.zeros(0, dtype=dtype)
+
+def write_solution_file(fileName, values, trucks, shipments, inventories=None):
+  '''
+  Writes the values and the truck, shipment and inventory records. The shipments must be grouped by truck in the order
+  of the trucks. Files whose name ends with .npz are binary, others are text as written by MIP.writeUsedTrucks.
+  '''
+  if inventories is None:
+    inventories = np.zeros(0, dtype=INVENTORY_DTYPE)
+  if fileName.endswith('.npz'):
+    f = open(fileName, 'wb')
+    np.savez(f, values=np.array(values, dtype=float), trucks=trucks, shipments=shipments,
+      inventories=inventories[np.abs(inventories['count']) > 1.0e-9])
+    f.close()
+    return
+
+  f = open(fileName, 'w')
+  for name,value in zip(VALUE_NAMES, values):
+    f.write(f'{name} {value}\n')
+  f.write('\n')
+
+  for node,tick,destination,shift,count in inventories.tolist():
+    f.write(f'I {(node, tick, destination, shift)} {count}\n')
+
+  for source,target,time,count in trucks.tolist():
+    f.write(f'T {source} {target} {time}\n')
+
+  f.write('\n')
+
+  shipmentList = shipments.tolist()
+  s = 0
+  for source,target,time,count in trucks.tolist():
+    while s < len(shipmentList) and shipmentList[s][:2] == (source,target) and shipmentList[s][4] == time:
+      _,_,destination,shift,_,trolleys = shipmentList[s]
+      f.write(f'S {source} {target} {destination} {shift} {time} {math.ceil(round(trolleys,2))}\n')
+      s += 1
+    f.write(f'C {source} {target} {time} {count}\n')
+  f.close()
+
+def read_solution_file(fileName):
+  '''Reads a solution written by write_solution_file in either format and returns it as a SolutionFile.'''
+  if fileName.endswith('.npz'):
+    with np.load(fileName) as data:
+      return SolutionFile(data['values'].tolist(), data['trucks'], data['shipments'], data['inventories'])
+
+  values = {}
+  usedTrucks = []
+  counts = {}
+  shipments = []
+  inventories = []
+  f = open(fileName, 'r')
+  for line in f:
+    split = line.split()
+    if not split:
+      continue
+    if split[0] in VALUE_NAMES:
+      values[split[0]] = float(split[1])
+    elif split[0] == 'T':
+      usedTrucks.append((int(split[1]), int(split[2]), float(split[3])))
+    elif split[0] == 'C':
+      counts[int(split[1]), int(split[2]), float(split[3])] = int(split[4])
+    elif split[0] == 'S':
+      shipments.append((int(split[1]), int(split[2]), int(split[3]), int(split[4]), float(split[5]), float(split[6])))
+    elif split[0] == 'I':
+      key = line[1:line.index(')')+1].strip(' ()').split(',')
+      inventories.append(tuple(int(k) for k in key) + (float(line[line.index(')')+1:]),))
+  f.close()
+
+  # Trucks without a C line carry no trolleys, and trucks with a C line are used even without a T line.
+  known = set(usedTrucks)
+  usedTrucks += [ key for key in counts if not key in known ]
+  trucks = [ key + (counts.get(key, 0),) for key in usedTrucks ]
+  return SolutionFile([ values.get(name, 0.0) for name in VALUE_NAMES ], records(trucks, TRUCK_DTYPE),
+    records(shipments, SHIPMENT_DTYPE), records(inventories, INVENTORY_DTYPE))
+
+class SolutionWriter:
+  '''
+  Writes solutions in a background thread. submit hands over the raw data of a solution, which the thread turns into
+  (values, trucks, shipments) with toRecords and writes with write_solution_file. If several solutions arrive while a
+  file is being written, only the latest one is written next. Each file is written under a temporary name first and then
+  renamed, such that the file always holds a complete solution.
+  '''
+
+  def __init__(self, fileName, toRecords):
+    self._fileName = fileName
+    self._toRecords = toRecords
+    self._pending = None
+    self._closed = False
+    self._condition = threading.Condition()
+    self.numWritten = 0
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def submit(self, *data):
+    with self._condition:
+      self._pending = data
+      self._condition.notify()
+
+  def close(self):
+    '''Waits until the last submitted solution is written and stops the thread.'''
+    with self._condition:
+      self._closed = True
+      self._condition.notify()
+    self._thread.join()
+
+  def _run(self):
+    base, extension = os.path.splitext(self._fileName)
+    temporaryFileName = f'{base}.tmp{extension}'
+    while True:
+      with self._condition:
+        while self._pending is None and not self._closed:
+          self._condition.wait()
+        if self._pending is None:
+          return
+        data = self._pending
+        self._pending = None
+      values, trucks, shipments = self._toRecords(*data)
+      write_solution_file(temporaryFileName, values, trucks, shipments)
+      os.replace(temporaryFileName, self._fileName)
+      self.numWritten += 1
+
+if __name__ == "__main__":
+
+  if len(sys.argv) < 3:
+    print(f'Usage: {sys.argv[0]} <input solution file> <output solution file>')
+    print('Converts between the text and binary (.npz) solution formats, e.g., to export a binary solution as text.')
+    sys.exit(1)
+
+  solution = read_solution_file(sys.argv[1])
+  write_solution_file(sys.argv[2], solution.values, solution.trucks, solution.shipments, solution.inventories)
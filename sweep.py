@@ -0,0 +1,159 @@
+import sys
+import os
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from common import *
+from mip import run_experiments
+
+def printUsage(errorMessage=None):
+  if errorMessage is not None:
+    print(f'Error: {errorMessage}')
+  print(f'Usage: {sys.argv[0]} <network file name> <tickhours> <tickzero> <seeds file name> <trolleys file pattern> <results file name> [OPTIONS...]')
+  print('Solves the MIP for every seed in the seeds file, running several solves in parallel.')
+  print('In the trolleys file pattern and in all FILE patterns below, {seed} is replaced by the seed.')
+  print('Seeds that already appear in the results file are skipped, so an interrupted sweep can be resumed.')
+  print('Options:')
+  print('  -o FILE  Write used trucks to <FILE>.')
+  print('  -l FILE  Write the output of each solve to <FILE>.')
+  print('  -i FILE  Read used trucks from <FILE>.')
+  print('  -t TIME  After a feasible solution was, the solve has TIME seconds for solving.')
+  print('  -d DEV   Truck times may deviate up to DEV hours from the ones read from <FILE> to be considered allowed.')
+  print('  -m       Modify trolleys to become deliverable instead of removing them.')
+  print('  -c       Construct initial solution from that input file.')
+  print('  -v       Build variables and constraints in bulk via the matrix API.')
+  print('  -p       Only create variables that are reachable from a trolley release and can reach a deadline.')
+  print('  -s NAME  Use solver NAME, which is either gurobi (default) or highs.')
+  print('  -j NUM   Run NUM solves in parallel (default: 4).')
+  print('  -n NUM   Distribute NUM cores among the parallel solves (default: all cores).')
+  sys.exit(1)
+
+resultColumns = ['seed', 'objective', 'distance', 'penalty', 'notproduced', 'notdelivered', 'seconds']
+
+def solveScenario(seed, networkFileName, tickHours, tickZero, trolleysFileName, logFileName, options):
+  '''Solves a single scenario; runs in a worker process whose output is redirected to the log file.'''
+  if logFileName:
+    log = os.open(logFileName, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(log, sys.stdout.fileno())
+    os.dup2(log, sys.stderr.fileno())
+    os.close(log)
+  start = time.time()
+  try:
+    network = Network(networkFileName)
+    trolleys = network.readTrolleys(trolleysFileName)
+    vals = run_experiments(network=network, trolleys=trolleys, tickHours=tickHours, tickZero=tickZero, **options)
+  finally:
+    sys.stdout.flush()
+    sys.stderr.flush()
+  if vals is None:
+    return [seed, None, None, None, None, None, time.time() - start]
+  return [seed] + list(vals) + [time.time() - start]
+
+def readResults(fileName):
+  if not os.path.exists(fileName):
+    return {}
+  f = open(fileName, 'r')
+  results = { row['seed']: row for row in csv.DictReader(f) }
+  f.close()
+  return results
+
+if __name__ == "__main__":
+
+  if len(sys.argv) < 7:
+    printUsage('Requires 6 arguments.')
+
+  networkFileName = sys.argv[1]
+  tickHours = float(sys.argv[2])
+  tickZero = float(sys.argv[3])
+  seedsFileName = sys.argv[4]
+  trolleysPattern = sys.argv[5]
+  resultsFileName = sys.argv[6]
+
+  writeTrucksPattern = None
+  logPattern = None
+  numJobs = 4
+  numCores = os.cpu_count()
+  options = { 'modifyTrolleysDeliverable': False, 'readTrucksFileName': None, 'allowedTruckDeviation': 1e4,
+    'constructInitial': False, 'timeLimit': 86400, 'solutionLimit': None, 'solutionTimeLimit': 60,
+    'vectorized': False, 'prune': False, 'solver': 'gurobi' }
+  a = 7
+  while a < len(sys.argv):
+    arg = sys.argv[a]
+    if arg == '-o' and a+1 < len(sys.argv):
+      writeTrucksPattern = sys.argv[a+1]
+      a += 1
+    elif arg == '-l' and a+1 < len(sys.argv):
+      logPattern = sys.argv[a+1]
+      a += 1
+    elif arg == '-i' and a+1 < len(sys.argv):
+      options['readTrucksFileName'] = sys.argv[a+1]
+      a += 1
+    elif arg == '-t' and a+1 < len(sys.argv):
+      options['timeLimit'] = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-d' and a+1 < len(sys.argv):
+      options['allowedTruckDeviation'] = float(sys.argv[a+1])
+      a += 1
+    elif arg == '-m':
+      options['modifyTrolleysDeliverable'] = True
+    elif arg == '-c':
+      options['constructInitial'] = True
+    elif arg == '-v':
+      options['vectorized'] = True
+    elif arg == '-p':
+      options['prune'] = True
+    elif arg == '-s' and a+1 < len(sys.argv):
+      options['solver'] = sys.argv[a+1]
+      a += 1
+    elif arg == '-j' and a+1 < len(sys.argv):
+      numJobs = int(sys.argv[a+1])
+      a += 1
+    elif arg == '-n' and a+1 < len(sys.argv):
+      numCores = int(sys.argv[a+1])
+      a += 1
+    else:
+      printUsage(f'Unprocessed argument <{arg}>.')
+    a += 1
+
+  f = open(seedsFileName, 'r')
+  seeds = f.read().split()
+  f.close()
+
+  results = readResults(resultsFileName)
+  pendingSeeds = [ seed for seed in seeds if not seed in results ]
+  print(f'Sweeping {len(pendingSeeds)} of {len(seeds)} seeds; the others are already in <{resultsFileName}>.')
+
+  options['threads'] = max(1, numCores // numJobs)
+  print(f'Running {numJobs} solves in parallel with {options["threads"]} threads each.')
+
+  resultsFile = open(resultsFileName, 'a', newline='')
+  writer = csv.writer(resultsFile)
+  # A sweep that was interrupted before its first result leaves a file with only the header.
+  if resultsFile.tell() == 0:
+    writer.writerow(resultColumns)
+    resultsFile.flush()
+
+  with ProcessPoolExecutor(max_workers=numJobs) as executor:
+    futures = {}
+    for seed in pendingSeeds:
+      seedOptions = dict(options, writeTrucksFileName=writeTrucksPattern.format(seed=seed) if writeTrucksPattern else None,
+        readTrucksFileName=options['readTrucksFileName'].format(seed=seed) if options['readTrucksFileName'] else None)
+      logFileName = logPattern.format(seed=seed) if logPattern else None
+      futures[executor.submit(solveScenario, seed, networkFileName, tickHours, tickZero, trolleysPattern.format(seed=seed), logFileName, seedOptions)] = seed
+    for future in as_completed(futures):
+      seed = futures[future]
+      try:
+        row = future.result()
+      except Exception as e:
+        print(f'Seed {seed} failed: {e}')
+        continue
+
+      # We write each result immediately such that an interrupted sweep can be resumed.
+      writer.writerow(row)
+      resultsFile.flush()
+      if row[1] is None:
+        print(f'Seed {seed}: no solution found.')
+      else:
+        print(f'Seed {seed}: value {row[1]} with total distance {row[2]:.2f} and penalties {row[3]:.1f} after {row[6]:.0f} seconds.')
+
+  resultsFile.close()
@@ -0,0 +1,78 @@
+import sys
+import json
+import math
+import time
+from contextlib import contextmanager
+try:
+  import resource
+except ImportError:
+  resource = None
+
+def peak_rss():
+  '''Returns the peak resident set size of this process in bytes, or None if the platform does not report it.'''
+  if resource is None:
+    return None
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return rss if sys.platform == 'darwin' else rss * 1024
+
+def finite(value):
+  '''Returns value, or None if it is missing or infinite, e.g., a bound or incumbent that the solver does not know yet.'''
+  if value is None or not math.isfinite(value) or abs(value) >= 1.0e100:
+    return None
+  return value
+
+class Telemetry:
+  '''
+  Appends events as JSON lines to a file. Every event has a name, the seconds since the telemetry was created, the peak
+  RSS and the given fields. Phases are timed with phase(), which emits one event when the phase ends, with failed set
+  if it raised. With fileName None, the events are kept in the list events instead, which is None otherwise.
+  '''
+
+  def __init__(self, fileName, **fields):
+    self._file = open(fileName, 'a') if fileName is not None else None
+    self._start = time.time()
+    self._fields = fields
+    self._lastProgress = None
+    self.events = [] if self._file is None else None
+
+  def event(self, name, **fields):
+    record = { 'event': name, 'time': round(time.time() - self._start, 6), 'peakRss': peak_rss() }
+    record.update(self._fields)
+    record.update(fields)
+    if self._file is None:
+      self.events.append(record)
+    else:
+      self._file.write(json.dumps(record) + '\n')
+      self._file.flush()
+
+  @contextmanager
+  def phase(self, name, size=None, **fields):
+    '''Times the code in the with block; size is called afterwards and returns more fields, e.g., the model size.'''
+    start = time.time()
+    try:
+      yield
+    except BaseException:
+      fields['failed'] = True
+      raise
+    finally:
+      seconds = time.time() - start
+      if size is not None:
+        fields.update(size())
+      self.event('phase', phase=name, seconds=round(seconds, 6), **fields)
+
+  def progress(self, runtime, incumbent, bound, minInterval=1.0):
+    '''
+    Records a point of the incumbent and bound trajectory if the incumbent changed, minInterval seconds passed or the
+    runtime went back because a new solve started.
+    '''
+    incumbent, bound = finite(incumbent), finite(bound)
+    if self._lastProgress is not None:
+      lastRuntime, lastIncumbent = self._lastProgress
+      if incumbent == lastIncumbent and lastRuntime <= runtime < lastRuntime + minInterval:
+        return
+    self._lastProgress = (runtime, incumbent)
+    self.event('progress', runtime=runtime, incumbent=incumbent, bound=bound)
+
+  def close(self):
+    if self._file is not None:
+      self._file.close()
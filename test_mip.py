@@ -0,0 +1,76 @@
+import math
+import pytest
+from common import *
+from mip import build_model
+from solutionfile import read_solution_file
+from randomInstance import write_random_instance
+
+# The instance is small enough for the size-limited Gurobi license and is solved to optimality within seconds.
+TICK_HOURS = 1.0
+
+@pytest.fixture(scope='module')
+def instance(tmp_path_factory):
+  directory = tmp_path_factory.mktemp('instance')
+  networkFileName = str(directory / 'tiny.network')
+  trolleysFileName = str(directory / 'tiny.csv')
+  write_random_instance(networkFileName, trolleysFileName, 3, 1, 2, 40, seed=1)
+  return networkFileName, trolleysFileName
+
+def build(instance, vectorized=False, prune=False, solver='highs'):
+  network = Network(instance[0], useCache=False)
+  trolleys = network.readTrolleys(instance[1])
+  network.setDiscretization(TICK_HOURS, 0.0)
+  return build_model(network, trolleys, False, None, 1e4, vectorized, prune, solver)
+
+def lp_tokens(fileName):
+  '''Returns the tokens of an LP file without comments, where zeros lose their sign and line breaks do not matter.'''
+  f = open(fileName, 'r')
+  tokens = [ token for line in f if not line.startswith('\\') for token in line.split() ]
+  f.close()
+  return [ '0' if token in ['-0', '+0', '0'] else token for token in tokens ]
+
+def test_vectorized_model_equals_loop_model(instance, tmp_path):
+  pytest.importorskip('gurobipy')
+  for vectorized in [False, True]:
+    build(instance, vectorized, solver='gurobi').write(str(tmp_path / f'{vectorized}.lp'))
+  assert lp_tokens(tmp_path / 'False.lp') == lp_tokens(tmp_path / 'True.lp')
+
+def test_prune_keeps_optimum(instance):
+  objectives = []
+  for prune in [False, True]:
+    mip = build(instance, vectorized=True, prune=prune)
+    mip.optimize()
+    objectives.append(mip.getSolutionValue()[0])
+  assert objectives[1] == pytest.approx(objectives[0], rel=1e-6)
+
+def test_solution_file_round_trip(instance, tmp_path):
+  mip = build(instance, vectorized=True)
+  mip.optimize()
+  vals = mip.getSolutionValue()
+  assert mip.writeUsedTrucks(str(tmp_path / 'tiny.sol'))
+  assert mip.writeUsedTrucks(str(tmp_path / 'tiny.npz'))
+  text = read_solution_file(str(tmp_path / 'tiny.sol'))
+  binary = read_solution_file(str(tmp_path / 'tiny.npz'))
+
+  assert binary.values == pytest.approx(vals) and text.values == pytest.approx(vals)
+  assert text.truckCounts() == binary.truckCounts()
+  # The text format rounds trolley numbers up and keeps zero inventories, which the binary format drops.
+  assert text.flows() == { key: math.ceil(round(count, 2)) for key,count in binary.flows().items() }
+  assert [ tuple(record) for record in text.inventories.tolist() if abs(record[-1]) > 1.0e-9 ] == binary.inventories.tolist()
+
+def test_heuristic_plans_are_feasible_starts(instance):
+  from heuristic import construct_greedy
+  from localsearch import improve_solution
+  mip = build(instance, vectorized=True)
+  greedyVals, greedySolution = construct_greedy(mip)
+  improvedVals, improvedSolution = improve_solution(mip, greedyVals, greedySolution, 5, maxIterations=1000)
+  assert improvedVals[0] <= greedyVals[0] + 1.0e-6
+
+  for vals,solution in [(greedyVals, greedySolution), (improvedVals, improvedSolution)]:
+    mip = build(instance, vectorized=True)
+    mip.constructInitialSolutionFrom(*solution, complete=True)
+    mip.setSollimit(1)
+    mip.optimize()
+    # The start does not count towards the solution limit, so the solver may find one better solution.
+    assert mip.getSolCount() > 0
+    assert mip.getSolutionValue()[0] <= vals[0] + 1.0e-6